@@ -0,0 +1,150 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+CATEGORIES = ('yes', 'no')
+QUESTIONS = (1, 2, 3, 4)
+LLM_RATER = 'LLM'
+
+_column_pattern = re.compile(r"^(?P<rater>.+)-(?P<question>\d+)$")
+
+
+def rating_columns(df):
+    """Maps each rater to {question: column} from review-sheet columns named like 'DRH-1'."""
+    raters = {}
+    for col in df.columns:
+        match = _column_pattern.match(str(col))
+        if match:
+            raters.setdefault(match.group('rater'), {})[int(match.group('question'))] = col
+    return raters
+
+
+def rating_codes(df, raters, questions=QUESTIONS, categories=CATEGORIES):
+    """Encodes the ratings of raters ({rater: {question: column}}) as an int array of shape
+    (questions, items, raters).
+
+    Each cell is the index of the rating in categories (case-insensitive), or -1 when the
+    rating is missing, outside the categories, or the rater has no column for that question.
+    """
+    lookup = {category: i for i, category in enumerate(categories)}
+    codes = np.full((len(questions), len(df), len(raters)), -1, dtype=np.int8)
+    for r, columns in enumerate(raters.values()):
+        for q, question in enumerate(questions):
+            col = columns.get(question)
+            if col is None:
+                continue
+            # only the few distinct answers are normalized, then broadcast back to the items
+            value_codes, uniques = pd.factorize(df[col])
+            unique_codes = np.array([lookup.get(str(value).strip().lower(), -1) for value in uniques] + [-1],
+                                    dtype=np.int8)
+            codes[q, :, r] = unique_codes[value_codes]
+    return codes
+
+
+def one_hot(codes, n_categories):
+    """(..., raters) codes -> (..., raters, categories) float indicators; missing codes are all zero."""
+    return (codes[..., None] == np.arange(n_categories)).astype(np.float64)
+
+
+def category_counts(codes, n_categories=len(CATEGORIES)):
+    """Per question and item, how many raters chose each category: shape (questions, items, categories)."""
+    return one_hot(codes, n_categories).sum(axis=-2)
+
+
+def fleiss_kappa_per_question(codes, n_categories=len(CATEGORIES), weights=None):
+    """Fleiss' kappa for every question at once.
+
+    Only items rated (within the categories) by every rater are used, as in the original
+    per-question tables. Questions with fewer than 2 such items, or with fewer than 2 raters,
+    give NaN.
+
+    weights is an optional (resamples, items) array of item multiplicities (e.g. bootstrap
+    resamples); the result then has shape (resamples, questions).
+    """
+    single = weights is None
+    if single:
+        weights = np.ones((1, codes.shape[1]))
+    n_raters = codes.shape[-1]
+    counts = category_counts(codes, n_categories)  # (Q, N, C)
+    complete = (codes >= 0).all(axis=-1).astype(np.float64)  # (Q, N)
+    n_items = weights @ complete.T  # (B, Q)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p_j = np.einsum('bn,qnc->bqc', weights, counts * complete[..., None]) / (n_items[..., None] * n_raters)
+        p_i = ((counts ** 2).sum(axis=-1) - n_raters) / (n_raters * (n_raters - 1))
+        p_bar = weights @ (p_i * complete).T / n_items
+        p_e = (p_j ** 2).sum(axis=-1)
+        kappa = (p_bar - p_e) / (1 - p_e)
+    kappa[(n_items < 2) | (n_raters < 2)] = np.nan
+    return kappa[0] if single else kappa
+
+
+def cohens_kappa_matrix(codes, n_categories=len(CATEGORIES), weights=None):
+    """Pairwise Cohen's kappa between all raters for every question: shape (questions, raters, raters).
+
+    Each pair uses the items both raters rated; pairs with fewer than 2 such items give NaN.
+    With (resamples, items) weights the result has shape (resamples, questions, raters, raters).
+    """
+    single = weights is None
+    if single:
+        weights = np.ones((1, codes.shape[1]))
+    indicators = one_hot(codes, n_categories)  # (Q, N, R, C)
+    rated = (codes >= 0).astype(np.float64)  # (Q, N, R)
+    # all contractions over items are batched matrix products
+    weighted_rated = weights[:, None, :, None] * rated  # (B, Q, N, R)
+    n_common = weighted_rated.transpose(0, 1, 3, 2) @ rated  # (B, Q, R, R)
+    by_category = indicators.transpose(0, 3, 2, 1)  # (Q, C, R, N)
+    weighted_by_category = weights[:, None, None, None, :] * by_category  # (B, Q, C, R, N)
+    agree = (weighted_by_category @ by_category.transpose(0, 1, 3, 2)).sum(axis=2)
+    marginal_r = (weighted_by_category @ rated[:, None]).transpose(0, 1, 3, 4, 2)  # (B, Q, R, S, C)
+    marginal_s = marginal_r.transpose(0, 1, 3, 2, 4)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p_o = agree / n_common
+        p_e = (marginal_r * marginal_s).sum(axis=-1) / n_common ** 2
+        kappa = (p_o - p_e) / (1 - p_e)
+    kappa[n_common < 2] = np.nan
+    return kappa[0] if single else kappa
+
+
+def majority_vote(codes, n_categories=len(CATEGORIES)):
+    """Most common category per question and item (-1 when unrated or tied)."""
+    counts = category_counts(codes, n_categories)
+    winner = counts.argmax(axis=-1)
+    top = counts.max(axis=-1)
+    tied = (counts == top[..., None]).sum(axis=-1) > 1
+    return np.where((top > 0) & ~tied, winner, -1)
+
+
+def agreement_report(df, llm_rater=LLM_RATER, questions=QUESTIONS, categories=CATEGORIES):
+    """Computes every agreement statistic from the review sheet in one pass.
+
+    Returns a dict with the human raters, the (questions, items, categories) count matrix,
+    Fleiss' kappa per question among humans, the Cohen's kappa matrix among all raters
+    (humans plus the LLM) per question, and per-question LLM agreement with the human
+    majority vote.
+    """
+    raters = rating_columns(df)
+    humans = [rater for rater in raters if rater != llm_rater]
+    all_raters = humans + ([llm_rater] if llm_rater in raters else [])
+    codes = rating_codes(df, {rater: raters[rater] for rater in all_raters}, questions, categories)
+    human_codes = codes[..., :len(humans)]
+    report = {
+        'raters': all_raters,
+        'humans': humans,
+        'counts': category_counts(human_codes, len(categories)),
+        'fleiss_kappa': pd.Series(fleiss_kappa_per_question(human_codes, len(categories)),
+                                  index=[f'question_{q}' for q in questions]),
+        'cohens_kappa': {f'question_{q}': pd.DataFrame(matrix, index=all_raters, columns=all_raters)
+                         for q, matrix in zip(questions, cohens_kappa_matrix(codes, len(categories)))},
+    }
+    if llm_rater in raters:
+        llm_codes = codes[..., -1]
+        majority = majority_vote(human_codes, len(categories))
+        comparable = (llm_codes >= 0) & (majority >= 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            match_rate = ((llm_codes == majority) & comparable).sum(axis=1) / comparable.sum(axis=1)
+        report['llm_vs_majority'] = pd.Series(match_rate, index=[f'question_{q}' for q in questions])
+        report['llm_vs_humans'] = pd.DataFrame(
+            [report['cohens_kappa'][f'question_{q}'].loc[llm_rater, humans] for q in questions],
+            index=[f'question_{q}' for q in questions])
+    return report
@@ -1,19 +1,186 @@
-from openai import OpenAI
-import pandas as pd
+from openai import OpenAI, Timeout
 import configparser
-import re
 import json
+import os
+import threading
+import time
+from change_detection import ChangeTracker, metadata_settings
+from judge_voting import NOT_JUDGED, QUESTION_COUNT, aggregate_votes, is_unanimous, is_valid_evaluation
+from llm_retry import CallTimeout, CircuitBreaker, RetryPolicy, call_with_retry, load_retry_config
+from llm_engine import estimate_message_tokens, estimate_tokens, get_rate_limiter, load_engine_config, run_in_order
+from measure_index import MeasureIndex
+from message_builder import PromptCacheStats, build_messages
+from metadata_retrieval import load_metadata_context
+from response_cache import cache_key, load_response_cache
+from result_journal import ResultJournal, journal_key, text_hash
+from results_store import export_parquet, is_jsonl, read_results, render_report, write_results
+from stream_parser import StreamParser
+from tally import tally_results
+from telemetry import CallTimer, load_telemetry
 
-config = configparser.ConfigParser()
-config.read('config.ini')
-api_key = config.get('API', 'api_key')
-base_url = config.get('API', 'base_url')
-llm = OpenAI(
-    api_key=api_key,
-    base_url=base_url,
-)
+config_filepath = 'config.ini'
+HALLUCINATION_QUESTION = 3  # the evaluation question a failed precheck answers without a judge
+_runtime = None
+_runtime_lock = threading.Lock()
 
-def generate_prompts(input_filepath, output_filepath):
+class LLMRuntime:
+    """The client plus everything shared by its calls (limits, retries, cache, telemetry), from one config.ini."""
+
+    def __init__(self, config_filepath='config.ini'):
+        config = configparser.ConfigParser()
+        config.read(config_filepath)
+        base_url = config.get('API', 'base_url')
+        self.engine_config = load_engine_config(config)
+        self.retry_config = load_retry_config(config)
+        self.llm = OpenAI(
+            api_key=config.get('API', 'api_key'),
+            base_url=base_url,
+            # retries are handled by call_with_retry; the read timeout is the stream-idle timeout
+            max_retries=0,
+            timeout=Timeout(self.retry_config['call_timeout'], read=self.retry_config['stream_idle_timeout']),
+        )
+        self.retry_policy = RetryPolicy(self.retry_config['max_attempts'], self.retry_config['base_delay'],
+                                        self.retry_config['max_delay'])
+        self.circuit_breaker = CircuitBreaker(self.retry_config['breaker_threshold'],
+                                              self.retry_config['breaker_reset'])
+        self.rate_limiter = get_rate_limiter(base_url, self.engine_config['requests_per_minute'],
+                                             self.engine_config['tokens_per_minute'])
+        self.response_cache = load_response_cache(config)
+        self.prompt_cache_stats = PromptCacheStats()
+        self.telemetry = load_telemetry(config)
+
+def get_runtime():
+    """The shared LLMRuntime, built from config_filepath on first use so importing this module is cheap."""
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                _runtime = LLMRuntime(config_filepath)
+    return _runtime
+
+def configure(filepath):
+    """Switches to another config.ini; the runtime is rebuilt on its next use."""
+    global config_filepath, _runtime
+    with _runtime_lock:
+        config_filepath = filepath
+        _runtime = None
+
+def json_answer(parsed, opening):
+    """The value in a completion's ```json fence if it parses and starts with opening ('{' or '['), else None."""
+    json_string = parsed.json_text
+    if json_string is None or not json_string.startswith(opening):
+        return None
+    try:
+        return json.loads(json_string)
+    except json.JSONDecodeError:
+        return None
+
+def stream_completion(messages, model="DeepSeek-R1", require_think=True, stop_after_json=False, stage=None, sample=0,
+                      validate=None, **params):
+    """Streams a chat completion into a StreamParser, served from the response cache when possible.
+
+    With stop_after_json, the stream is closed as soon as the closing ```json fence arrives, and
+    the call's tokens are estimated. With usage_after_json (and include_usage) in [ENGINE],
+    parsing stops there but the stream is read on to the final usage chunk instead.
+    Every call is recorded in telemetry under the given stage. sample only distinguishes
+    repeated samples of the same request in the response cache.
+
+    Only completions accepted by validate(parser) are cached, so a malformed answer is
+    requested again next time instead of being replayed; cached entries it rejects are
+    ignored. By default a completion is accepted once its think section ended (with
+    require_think) and its JSON fence closed (with stop_after_json).
+    """
+    def accepted(parsed):
+        if validate is not None:
+            return validate(parsed)
+        return (not require_think or parsed.answer is not None) and (not stop_after_json or parsed.json_complete)
+
+    runtime = get_runtime()
+    key = cache_key(model, messages, dict(params, sample=sample) if sample else params)
+    cached = runtime.response_cache.get(key)
+    if cached is not None:
+        parsed = StreamParser.from_text(cached, require_think)
+        if accepted(parsed):
+            runtime.telemetry.record(stage=stage, model=model, status='cached')
+            return parsed
+    include_usage = runtime.engine_config['include_usage']
+    usage_after_json = include_usage and runtime.engine_config['usage_after_json']
+    if include_usage:
+        params_with_usage = dict(params, stream_options={"include_usage": True})
+    else:
+        params_with_usage = params
+    retries = []
+
+    def attempt():
+        runtime.rate_limiter.acquire(estimate_message_tokens(messages))
+        timer = CallTimer()
+        try:
+            completion = runtime.llm.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                **params_with_usage
+            )
+            parser = StreamParser(require_think)
+            usage = None
+            answered = False
+            for chunk in completion:
+                if getattr(chunk, 'usage', None) is not None:
+                    usage = chunk.usage
+                if chunk.choices and not answered:
+                    content = chunk.choices[0].delta.content
+                    if content is not None:
+                        timer.mark_first_token()
+                        parser.feed(content)
+                        if stop_after_json and parser.json_complete:
+                            answered = True
+                            if not usage_after_json:
+                                completion.close()
+                                break
+                if time.monotonic() - timer.start > runtime.retry_config['call_timeout']:
+                    completion.close()
+                    raise CallTimeout(f"Call exceeded {runtime.retry_config['call_timeout']}s")
+        finally:
+            timer.stop()
+        return parser, usage, timer
+
+    def on_retry(attempt_number, e, delay):
+        retries.append(type(e).__name__)
+        print(f"Retrying after {type(e).__name__} (attempt {attempt_number + 1}), waiting {delay:.1f}s")
+
+    try:
+        parser, usage, timer = call_with_retry(attempt, runtime.retry_policy, runtime.circuit_breaker, on_retry)
+    except Exception as e:
+        runtime.telemetry.record(stage=stage, model=model, status='error', error_type=type(e).__name__,
+                                 retries=len(retries))
+        raise
+    runtime.prompt_cache_stats.record(usage)
+    runtime.telemetry.record(stage=stage, model=model, status='ok', latency=timer.latency, ttft=timer.ttft,
+                     retries=len(retries), **usage_metrics(messages, parser, usage))
+    if accepted(parser):
+        runtime.response_cache.put(key, parser.text, model=model)
+    return parser
+
+def usage_metrics(messages, parser, usage):
+    """Token counts for telemetry, from the usage field when reported and estimated otherwise."""
+    think_text = parser.text[:parser.think_end] if parser.think_end is not None else ''
+    reasoning_tokens = estimate_tokens(think_text) if think_text else 0
+    answer_tokens = estimate_tokens(parser.text[len(think_text):]) if len(parser.text) > len(think_text) else 0
+    if usage is None:
+        return {'prompt_tokens': estimate_message_tokens(messages), 'completion_tokens': reasoning_tokens + answer_tokens,
+                'reasoning_tokens': reasoning_tokens, 'answer_tokens': answer_tokens, 'estimated_tokens': True}
+    details = getattr(usage, 'completion_tokens_details', None)
+    reported_reasoning = getattr(details, 'reasoning_tokens', None) if details is not None else None
+    if reported_reasoning:
+        reasoning_tokens = reported_reasoning
+        answer_tokens = usage.completion_tokens - reported_reasoning
+    return {'prompt_tokens': usage.prompt_tokens, 'completion_tokens': usage.completion_tokens,
+            'reasoning_tokens': reasoning_tokens, 'answer_tokens': answer_tokens, 'estimated_tokens': False}
+
+def generate_prompts(input_filepath, output_filepath, max_concurrency=None):
+    """Generates three candidate prompts per topic, running topics concurrently (output keeps topic order)."""
+    if max_concurrency is None:
+        max_concurrency = get_runtime().engine_config['max_concurrency']
     system_prompt = """
                     Your job is to generate prompts/questions that will be used for evaluation of an LLM.
                     The goal of that LLM is to answer questions about various data sources related to opioid overdoses, using a metadata
@@ -28,42 +195,50 @@ def generate_prompts(input_filepath, output_filepath):
                     Ensure that your output can be properly parsed into a JSON object and is enclosed in json``` ``` tags.
     """
 
-    json_objects = []
+    def generate_topic(topic):
+        try:
+            parsed = stream_completion([
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": [
+                    {"type": "text", "text": f"The topic is: {topic}\n"}
+                ]},
+            ], require_think=False, stop_after_json=True, stage='generate',
+               validate=lambda parsed: json_answer(parsed, '{') is not None)
+        except Exception as e:
+            print(f"Generating prompts for '{topic}' failed: {e}")
+            return {'topic':topic, 'error':f"{type(e).__name__}: {e}"}
+        json_string = parsed.json_text
+        if json_string is not None and json_string.startswith('{'):
+            try:
+                data = json.loads(json_string)
+                data['topic'] = topic
+                return data
+            except json.JSONDecodeError as e:
+                return {'topic':topic, 'error':str(e)}
+        else:
+            print("No JSON object found enclosed in ```json ... ```")
+            return {'topic':topic, 'error':'No JSON output provided'}
+
     with open(input_filepath, 'r') as file:
-        for line in file:
-            topic = line.strip()
-            completion = llm.chat.completions.create(
-                model="DeepSeek-R1",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": [
-                        {"type": "text", "text": f"The topic is: {topic}\n"}
-                    ]},
-                ],
-                stream=True
-            )
-            all_content = ''
-            for chunk in completion:
-                if chunk.choices:
-                    content = chunk.choices[0].delta.content
-                    if content is not None:
-                        all_content += content
-            json_match = re.search(r"```json\s*(\{[\s\S]*?\})\s*```", all_content)
-            if json_match:
-                json_string = json_match.group(1)
-                try:
-                    data = json.loads(json_string)
-                    data['topic'] = topic
-                    json_objects.append(data)
-                except json.JSONDecodeError as e:
-                    json_objects.append({'topic':topic, 'error':e})
-            else:
-                print("No JSON object found enclosed in ```json ... ```")
-                json_objects.append({'topic':topic, 'error':'No JSON output provided'})
+        topics = [line.strip() for line in file if line.strip()]
+    json_objects = run_in_order(generate_topic, topics, max_concurrency)
     with open(output_filepath, 'w') as f:
         json.dump(json_objects, f, indent=4)
 
-def filter_prompts(input_filepath, output_filepath):
+def candidate_prompts(entry):
+    """The generated prompts of one topic entry, in prompt_1, prompt_2, ... order."""
+    keys = sorted((key for key in entry if key.startswith('prompt_')), key=lambda key: key.split('_', 1)[1].zfill(4))
+    return [entry[key] for key in keys if isinstance(entry[key], str) and entry[key].strip()]
+
+def filter_prompts(input_filepath, output_filepath, max_concurrency=None, chunk_size=25):
+    """Keeps one prompt per topic, map-reduce style.
+
+    Topics are filtered in chunks of chunk_size concurrently, so each request stays small no
+    matter how many topics there are. The merge pass then puts the chosen prompts back in
+    topic order; topics a chunk answer left out are re-filtered in smaller chunks.
+    """
+    if max_concurrency is None:
+        max_concurrency = get_runtime().engine_config['max_concurrency']
     system_prompt = """
                         The data provided to you is a JSON file containing topics, and three prompts for each topic.
                         Your job is to filter these down to leave just one prompt for each topic.
@@ -71,42 +246,63 @@ def filter_prompts(input_filepath, output_filepath):
                         data sources related to opioid overdoses, using a metadata file about each data measure.
                         The filtered prompts should be varied and effective in their evaluation of the capabilities of the LLM.
                         Be sure to include both clear/thorough prompts and short/unclear prompts in the final output.
-                        Please provide the output in the same format as the input, but with only one prompt for each topic.
+                        Please provide the output as a JSON list with one object per topic, of format [{'topic':'...', 'prompt':'...'}],
+                        keeping each topic and copying the chosen prompt exactly.
                         Ensure it is JSON parseable and enclosed in json``` ``` tags.
         """
 
-    with open(input_filepath, 'r') as file:
-        file_content = file.read()
-        completion = llm.chat.completions.create(
-            model="DeepSeek-R1",
-            messages=[
+    def filter_chunk(chunk):
+        """Maps one chunk of topic entries to {topic: chosen prompt}, re-splitting what is missing."""
+        if not chunk:
+            return {}
+        print(f"Filtering {len(chunk)} topics")
+        chosen = {}
+        try:
+            parsed = stream_completion([
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": [
                     {"type": "text",
                      "text": "Here is the input JSON file.\n"},
                     {"type": "text",
-                     "text": f"[file name]: {input_filepath}\n[file content begin]{file_content}[file content end]"}
+                     "text": f"[file name]: {input_filepath}\n[file content begin]{json.dumps(chunk, indent=4)}[file content end]"}
                 ]},
-            ],
-            stream=True
-        )
-        all_content = ''
-        for chunk in completion:
-            if chunk.choices:
-                content = chunk.choices[0].delta.content
-                if content is not None:
-                    all_content += content
-        json_match = re.search(r"```json\s*(\[[\s\S]*?\])\s*```", all_content)
-        if json_match:
-            json_string = json_match.group(1)
-            try:
-                data = json.loads(json_string)
-                with open(output_filepath, 'w') as f:
-                    json.dump(data, f, indent=4)
-            except json.JSONDecodeError as e:
-                print(e)
+            ], require_think=False, stop_after_json=True, stage='filter',
+               validate=lambda parsed: isinstance(json_answer(parsed, '['), list))
+            json_string = parsed.json_text
+            if json_string is not None and json_string.startswith('['):
+                for item in json.loads(json_string):
+                    if not isinstance(item, dict):
+                        continue
+                    prompt = item.get('prompt') or next(iter(candidate_prompts(item)), None)
+                    if isinstance(prompt, str) and prompt.strip():
+                        chosen.setdefault(item.get('topic'), prompt)
+            else:
+                print("No JSON object found enclosed in ```json ... ```")
+        except Exception as e:
+            print(f"Filtering {len(chunk)} topics failed: {type(e).__name__}: {e}")
+        missing = [entry for entry in chunk if entry['topic'] not in chosen]
+        if missing and len(chunk) > 1:
+            middle = (len(missing) + 1) // 2
+            chosen.update(filter_chunk(missing[:middle]))
+            chosen.update(filter_chunk(missing[middle:]))
+        return {entry['topic']: chosen[entry['topic']] for entry in chunk if entry['topic'] in chosen}
+
+    with open(input_filepath, 'r') as file:
+        entries = json.load(file)
+    entries = [{'topic': entry['topic'], **{f'prompt_{i + 1}': prompt for i, prompt in enumerate(candidate_prompts(entry))}}
+               for entry in entries if entry.get('error') is None and candidate_prompts(entry)]
+    chunks = [entries[i:i + chunk_size] for i in range(0, len(entries), chunk_size)]
+    chosen = {}
+    for chunk_chosen in run_in_order(filter_chunk, chunks, max_concurrency):
+        chosen.update(chunk_chosen)
+    data = []
+    for entry in entries:
+        if entry['topic'] in chosen:
+            data.append({'topic': entry['topic'], 'prompt': chosen[entry['topic']]})
         else:
-            print("No JSON object found enclosed in ```json ... ```")
+            print(f"No prompt kept for topic '{entry['topic']}'")
+    with open(output_filepath, 'w') as f:
+        json.dump(data, f, indent=4)
 
 def format_prompt_response(prompt, response):
     """Formats a single prompt-response pair."""
@@ -116,10 +312,22 @@ def format_prompt_evaluation(prompt, response):
     """Formats a single prompt-response pair."""
     return f"PROMPT:\n{prompt}\n\nEVALUATION:\n{response}\n\n{'='*40}\n"
 
-def test_prompts(input_filepath, output_filepath, metadata_json):
+def test_prompts(input_filepath, output_filepath, metadata_context, max_concurrency=None,
+                 model="DeepSeek-R1", journal_filepath=None, resume=False, report_filepath=None, parquet_filepath=None,
+                 incremental=False):
+    """Answers every prompt and writes one record per prompt to output_filepath (JSONL).
+
+    The PROMPT/RESPONSE text format is only rendered to report_filepath, and the records can
+    also be exported to parquet_filepath.
+
+    With incremental, only prompts that are new or whose relevant measures changed since the
+    previous run (see change_detection.ChangeTracker) are answered again; the others keep their
+    response from the previous output_filepath.
+    """
+    if max_concurrency is None:
+        max_concurrency = get_runtime().engine_config['max_concurrency']
     with open(input_filepath, 'r') as file:
         data = json.load(file)
-    results = {}
     system_prompt = """
                     Please answer questions about the provided metadata file. Only use the data in this file to answer questions. 
                     If a question does not pertain to the metadata file, just say so and do not attempt to answer. 
@@ -132,43 +340,63 @@ def test_prompts(input_filepath, output_filepath, metadata_json):
 
     # with open(metadata_filepath, 'r') as file:
     #     file_content = file.read()
-    for prompt_dict in data:
+    def prompt_messages(prompt):
+        return build_messages(system_prompt, f"{prompt}\n", metadata_context.for_query(prompt), metadata_context.filename)
+
+    journal = ResultJournal(journal_filepath or f"{output_filepath}.journal.jsonl", resume=resume)
+
+    def test_prompt(prompt_dict):
         prompt = prompt_dict['prompt']
+        record = {'prompt': prompt, 'topic': prompt_dict.get('topic'), 'model': model}
+        key = journal_key(prompt, model, system_prompt)
+        if tracker is not None:
+            key = f"{key}:{tracker.digest}"
+        if key in journal:
+            return dict(record, response=journal.get(key)['response'])
         print(prompt)
         try:
-            completion = llm.chat.completions.create(
-                model="DeepSeek-R1",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": [
-                        {"type": "text",
-                         "text": f"{prompt}\n"},
-                        {"type": "text",
-                         "text": f"[file name]: metadata.json\n[file content begin]{metadata_json}[file content end]"}
-                    ]},
-                ],
-                stream=True
-            )
-            all_content = ''
-            for chunk in completion:
-                if chunk.choices:
-                    content = chunk.choices[0].delta.content
-                    if content is not None:
-                        all_content += content
-            match = re.search(r"</think>(.*)", all_content, re.DOTALL)
-            if match:
-                response = match.group(1).strip()
-                results[prompt] = response
+            parsed = stream_completion(prompt_messages(prompt), model=model, stage='test')
+            if parsed.answer is not None:
+                response = parsed.answer
+                journal.append(key, {'prompt': prompt, 'model': model, 'response': response})
+                return dict(record, response=response)
             else:
-                results[prompt] = 'No response found'
+                return dict(record, response=None, error='No response found')
         except Exception as e:
-            results[prompt] = e
-    with open(output_filepath, 'w', encoding='utf-8') as f:
-        for prompt, response in results.items():
-            formatted_entry = format_prompt_response(prompt, response)
-            f.write(formatted_entry)
+            return dict(record, response=None, error=f"{type(e).__name__}: {e}")
+
+    tracker = None
+    previous = {}
+    if incremental:
+        tracker = ChangeTracker(f"{output_filepath}.manifest.json", metadata_context,
+                                {'stage': 'test', 'model': model, 'system_prompt': text_hash(system_prompt),
+                                 'metadata': metadata_settings(metadata_context)})
+        if os.path.exists(output_filepath):
+            previous = {record['prompt']: record for record in read_results(output_filepath)
+                        if record.get('error') is None}
+
+    def test_prompt_incremental(prompt_dict):
+        prompt = prompt_dict['prompt']
+        key = tracker.item_key(prompt)
+        if prompt in previous and tracker.is_current(key, prompt):
+            return dict(previous[prompt], topic=prompt_dict.get('topic'))
+        result = test_prompt(prompt_dict)
+        if result.get('error') is None:
+            tracker.record(key, prompt, result['response'])
+        return result
+
+    results = run_in_order(test_prompt if tracker is None else test_prompt_incremental, data, max_concurrency)
+    if tracker is not None:
+        tracker.save()
+        print(tracker.summary(len(data)))
+    write_results(output_filepath, results)
+    if report_filepath is not None:
+        render_report(results, report_filepath, format_prompt_response)
+    if parquet_filepath is not None:
+        export_parquet(results, parquet_filepath)
 
 def read_prompt_response_pairs(filepath):
+    """Reads the legacy PROMPT/RESPONSE text format; new runs store responses as JSONL."""
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
             while True:
@@ -220,8 +448,52 @@ def read_prompt_response_pairs(filepath):
         print(f"Error: File not found at '{filepath}'")
         return
 
-def evaluate_prompts(input_filepath, output_filepath, metadata_json):
-    results = []
+def evaluate_prompts(input_filepath, output_filepath, metadata_context, max_concurrency=None,
+                     model="DeepSeek-R1", journal_filepath=None, resume=False, batch_size=1, judges=None,
+                     incremental=False, precheck=None):
+    """Judges every prompt/response pair against the four evaluation questions.
+
+    With batch_size > 1, up to batch_size pairs are judged per request (sharing one copy of
+    the metadata). Items missing or malformed in a batch answer are re-split into smaller
+    batches, down to single-pair requests; a failed batch call records its pairs as errors.
+
+    judges is an optional list of judge settings ({'model': ..., plus sampling parameters
+    such as temperature}). With several judges each pair is judged by a majority first,
+    concurrently; the remaining judges are only asked when those votes are not unanimous.
+    The answers are aggregated by majority vote with per-question vote counts.
+
+    With incremental, evaluations in the previous output_filepath are reused for unchanged
+    pairs whose relevant measures did not change (see change_detection.ChangeTracker).
+
+    precheck runs the local measure_index.MeasureIndex checks on every response first and
+    stores them with the evaluation. With 'focus', pairs that fail (the response cites dashboard
+    URLs or measure IDs that are not in the metadata) are sent to the judge with the findings.
+    With 'skip', pairs citing dashboard URLs that are not in the metadata are evaluated without
+    a judge call: question 3 is answered 'no' with the findings as the justification and the
+    other questions are NOT_JUDGED, so the tally still counts the hallucination against
+    question 3. Pairs failing only on measure IDs are judged as usual.
+    """
+    if max_concurrency is None:
+        max_concurrency = get_runtime().engine_config['max_concurrency']
+    if judges is None:
+        judges = [{'model': model}]
+    if batch_size > 1 and len(judges) > 1:
+        raise ValueError("Batched evaluation supports a single judge only")
+    if precheck not in (None, 'focus', 'skip'):
+        raise ValueError(f"Unknown precheck '{precheck}', expected None, 'focus' or 'skip'")
+
+    def sampling_params(judge):
+        return {name: value for name, value in judge.items() if name != 'model'}
+
+    def judge_label(judge):
+        # the sampling parameters are part of the label, so journal entries of other settings are not reused
+        params = sampling_params(judge)
+        return judge['model'] + (json.dumps(params, sort_keys=True) if params else '')
+
+    judges_label = '+'.join(judge_label(judge) for judge in judges) + (f"x{len(judges)}" if len(judges) > 1 else '')
+    if precheck == 'focus':
+        judges_label += '+precheck'
+    measure_index = MeasureIndex(metadata_context.metadata_df) if precheck is not None else None
     system_prompt = """
                     Your job is to evaluate a prompt/response pair to determine if the response is adequate.
                     The prompts concern data measures stored in a metadata file provided to you, and the answers were LLM-generated.
@@ -235,97 +507,265 @@ def evaluate_prompts(input_filepath, output_filepath, metadata_json):
                     [{'question':'1', 'answer':'yes', 'justification':'...'}, {'question':'2', 'answer':'no', 'justification':'...'}, ...]
                     Ensure that this JSON object is enclosed in json``` ``` tags.
     """
+    batch_system_prompt = """
+                    Your job is to evaluate several prompt/response pairs to determine if each response is adequate.
+                    The prompts concern data measures stored in a metadata file provided to you, and the answers were LLM-generated.
+                    Each pair is labelled with an item key (item_1, item_2, ...). Evaluate every item independently.
+                    When evaluating these responses, use the metadata file for help and specifically answer these four questions for each item:
+                    1. Is the question appropriately answered in a relevant and understandable way without misinterpretation?
+                    2. Does the response provide relevant measures/dashboards that addresses all parts of the question without ignoring any important available measures/dashboards?
+                    3. Does the response acknowledge a lack of appropriate data when applicable, rather than hallucinating fake measures?
+                    4. Is the data source and description accurately described, when applicable?
+                    Answer each of these four questions with a yes/no response, and if the answer is no, provide a justification.
+                    IMPORTANT: Please format your answer into a single parseable JSON object keyed by item, of the format:
+                    {'item_1': [{'question':'1', 'answer':'yes', 'justification':'...'}, {'question':'2', 'answer':'no', 'justification':'...'}, ...], 'item_2': [...], ...}
+                    Every item key must be present. Ensure that this JSON object is enclosed in json``` ``` tags.
+    """
     # with open(metadata_filepath, 'r') as file:
     #     file_content = file.read()
-    for prompt, response in read_prompt_response_pairs(input_filepath):
-        print(prompt)
+    def pair_query(pair):
+        return f"{pair['prompt']}\n{pair['response']}"
+
+    def failed_precheck(pair):
+        return pair.get('precheck') is not None and pair['precheck']['hallucinated']
+
+    def skipped_by_precheck(pair):
+        # only dashboard URLs missing from the metadata are certain enough to answer without a judge
+        return precheck == 'skip' and pair.get('precheck') is not None and bool(pair['precheck']['invalid_urls'])
+
+    def pair_text(pair):
+        text = f"PROMPT: {pair['prompt']}\nRESPONSE: {pair['response']}\n"
+        if precheck == 'focus' and failed_precheck(pair):
+            text += f"AUTOMATED CHECK: {measure_index.findings(pair['precheck'])}\n"
+        return text
+
+    def pair_messages(pair):
+        return build_messages(system_prompt, pair_text(pair), metadata_context.for_query(pair_query(pair)),
+                              metadata_context.filename)
+
+    def precheck_evaluation(pair):
+        justification = f"Automated check: {measure_index.findings(pair['precheck'])}"
+        return [{'question': str(q), 'answer': 'no', 'justification': justification} if q == HALLUCINATION_QUESTION
+                else {'question': str(q), 'answer': NOT_JUDGED, 'justification': 'Skipped after the automated check'}
+                for q in range(1, QUESTION_COUNT + 1)]
+
+    def pair_record(pair, **fields):
+        record = {'prompt': pair['prompt'], 'response': pair['response'], 'topic': pair.get('topic')}
+        if pair.get('precheck') is not None:
+            record['precheck'] = pair['precheck']
+        return dict(record, **fields)
+
+    def batch_messages(batch):
+        items_text = ''.join(f"ITEM: item_{i}\n{pair_text(pair)}\n" for i, pair in enumerate(batch, 1))
+        # each pair keeps its own top_k measures instead of sharing one top_k over the whole batch
+        metadata_text = metadata_context.for_queries([pair_query(pair) for pair in batch])
+        return build_messages(batch_system_prompt, items_text, metadata_text, metadata_context.filename)
+
+    journal = ResultJournal(journal_filepath or f"{output_filepath}.journal.jsonl", resume=resume)
+
+    def pair_key(pair):
+        # batched and single evaluations share keys, so either mode can resume the other
+        key = journal_key(f"PROMPT: {pair['prompt']}\nRESPONSE: {pair['response']}\n", judges_label, system_prompt)
+        return key if tracker is None else f"{key}:{tracker.digest}"
+
+    # pairs run on a pool of max_concurrency workers and each may ask several judges at once,
+    # so judge calls take a slot to keep the requests in flight within max_concurrency
+    judge_slots = threading.BoundedSemaphore(max(1, max_concurrency))
+
+    def judge_pair(pair, judge, sample=0):
+        """Asks one judge; returns (evaluation, None) or (None, error)."""
         try:
-            completion = llm.chat.completions.create(
-                model="DeepSeek-R1",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": [
-                        {"type": "text",
-                         "text": f"PROMPT: {prompt}\nRESPONSE: {response}\n"},
-                        {"type": "text",
-                         "text": f"[file name]: metadata.json\n[file content begin]{metadata_json}[file content end]"}
-                    ]},
-                ],
-                stream=True
-            )
-            all_content = ''
-            for chunk in completion:
-                if chunk.choices:
-                    content = chunk.choices[0].delta.content
-                    if content is not None:
-                        all_content += content
-            match = re.search(r"</think>(.*)", all_content, re.DOTALL)
-            if match:
-                evaluation = match.group(1).strip()
-                json_match = re.search(r"```json\s*(\[[\s\S]*?\])\s*```", evaluation)
-                if json_match:
-                    json_string = json_match.group(1)
-                    try:
-                        data = json.loads(json_string)
-                        final_dict = {}
-                        final_dict['prompt'] = prompt
-                        final_dict['response'] = response
-                        final_dict['evaluation'] = data
-                        results.append(final_dict)
-                    except json.JSONDecodeError as e:
-                        results.append({'prompt':prompt, 'response':response, 'error':str(e)})
+            with judge_slots:
+                parsed = stream_completion(pair_messages(pair), model=judge['model'], stop_after_json=True,
+                                           stage='evaluate', sample=sample,
+                                           validate=lambda parsed: (parsed.answer is not None
+                                                                    and is_valid_evaluation(json_answer(parsed, '['))),
+                                           **sampling_params(judge))
+            if parsed.answer is None:
+                return None, 'No evaluation found'
+            json_string = parsed.json_text
+            if json_string is None or not json_string.startswith('['):
+                return None, "No JSON object found enclosed in ```json ... ```"
+            return json.loads(json_string), None
+        except Exception as e:
+            return None, str(e)
+
+    def vote_pair(pair):
+        quorum = len(judges) // 2 + 1
+        votes = []
+        errors = []
+
+        def ask(indices):
+            indices = list(indices)
+            for evaluation, error in run_in_order(lambda i: judge_pair(pair, judges[i], sample=i), indices, len(indices)):
+                if error is None and is_valid_evaluation(evaluation):
+                    votes.append(evaluation)
                 else:
-                    results.append({'prompt': prompt, 'response': response, 'error': "No JSON object found enclosed in ```json ... ```"})
-            else:
-                results.append({'prompt':prompt, 'response':response, 'error':'No evaluation found'})
+                    errors.append(error or 'Malformed evaluation')
+
+        ask(range(quorum))
+        if len(votes) < quorum or not is_unanimous(votes):
+            ask(range(quorum, len(judges)))
+        if not votes:
+            return None, '; '.join(errors)
+        return aggregate_votes(votes), None
+
+    def evaluate_pair(pair):
+        prompt = pair['prompt']
+        if pair.get('error') is not None:
+            # the prompt was never answered, so there is nothing to judge
+            return pair_record(pair, error=pair['error'])
+        if skipped_by_precheck(pair):
+            return pair_record(pair, evaluation=precheck_evaluation(pair))
+        key = pair_key(pair)
+        if key in journal:
+            return pair_record(pair, evaluation=journal.get(key)['evaluation'])
+        print(prompt)
+        if len(judges) == 1:
+            evaluation, error = judge_pair(pair, judges[0])
+        else:
+            evaluation, error = vote_pair(pair)
+        if error is not None:
+            return pair_record(pair, error=error)
+        journal.append(key, {'prompt': prompt, 'model': judges_label, 'evaluation': evaluation})
+        return pair_record(pair, evaluation=evaluation)
+
+    def valid_batch(parsed, n_items):
+        # a partly usable answer is still used, but only a complete one is cached
+        evaluations = json_answer(parsed, '{')
+        return isinstance(evaluations, dict) and all(is_valid_evaluation(evaluations.get(f"item_{i}"))
+                                                     for i in range(1, n_items + 1))
+
+    def evaluate_batch(batch):
+        if not batch:
+            return []
+        if len(batch) == 1:
+            return [evaluate_pair(batch[0])]
+        print(f"Evaluating batch of {len(batch)}")
+        try:
+            with judge_slots:
+                parsed = stream_completion(batch_messages(batch), model=judges[0]['model'], stop_after_json=True,
+                                           stage='evaluate_batch',
+                                           validate=lambda parsed: valid_batch(parsed, len(batch)),
+                                           **sampling_params(judges[0]))
         except Exception as e:
-            results.append({'prompt':prompt, 'response':response, 'error':str(e)})
+            # the call already failed after every retry, so smaller batches would only add load
+            print(f"Batch evaluation failed: {e}")
+            return [pair_record(pair, error=str(e)) for pair in batch]
+        # a missing or malformed answer re-splits every item below
+        evaluations = json_answer(parsed, '{')
+        if not isinstance(evaluations, dict):
+            evaluations = {}
+        results = [None] * len(batch)
+        failed = []
+        for i, pair in enumerate(batch):
+            evaluation = evaluations.get(f"item_{i + 1}")
+            if is_valid_evaluation(evaluation):
+                journal.append(pair_key(pair), {'prompt': pair['prompt'], 'model': judges_label, 'evaluation': evaluation})
+                results[i] = pair_record(pair, evaluation=evaluation)
+            else:
+                failed.append(i)
+        if failed:
+            failed_pairs = [batch[i] for i in failed]
+            middle = (len(failed_pairs) + 1) // 2
+            retried = evaluate_batch(failed_pairs[:middle]) + evaluate_batch(failed_pairs[middle:])
+            for i, result in zip(failed, retried):
+                results[i] = result
+        return results
+
+    if is_jsonl(input_filepath):
+        pairs = list(read_results(input_filepath))
+    else:
+        pairs = [{'prompt': prompt, 'response': response}
+                 for prompt, response in read_prompt_response_pairs(input_filepath)]
+    if precheck is not None:
+        for pair in pairs:
+            if pair.get('error') is None:
+                pair['precheck'] = measure_index.check_response(pair['response'], pair['prompt'])
+    results = [None] * len(pairs)
+    tracker = None
+    if incremental:
+        tracker = ChangeTracker(f"{output_filepath}.manifest.json", metadata_context,
+                                {'stage': 'evaluate', 'judges': judges, 'system_prompt': text_hash(system_prompt),
+                                 'precheck': precheck, 'metadata': metadata_settings(metadata_context)})
+        previous = {}
+        if os.path.exists(output_filepath):
+            previous = {(record['prompt'], record['response']): record for record in read_results(output_filepath)
+                        if record.get('error') is None}
+        for i, pair in enumerate(pairs):
+            earlier = previous.get((pair['prompt'], pair['response']))
+            if (pair.get('error') is None and earlier is not None
+                    and tracker.is_current(tracker.item_key(pair['prompt'], pair['response']), pair_query(pair))):
+                results[i] = dict(earlier, topic=pair.get('topic'))
+    todo = [i for i, result in enumerate(results) if result is None]
+    if batch_size > 1:
+        pending = []
+        for i in todo:
+            if (pairs[i].get('error') is None and pair_key(pairs[i]) not in journal
+                    and not skipped_by_precheck(pairs[i])):
+                pending.append(i)
+            else:
+                results[i] = evaluate_pair(pairs[i])
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        batch_results = run_in_order(lambda batch: evaluate_batch([pairs[i] for i in batch]), batches, max_concurrency)
+        for batch, batch_result in zip(batches, batch_results):
+            for i, result in zip(batch, batch_result):
+                results[i] = result
+    else:
+        for i, result in zip(todo, run_in_order(evaluate_pair, [pairs[i] for i in todo], max_concurrency)):
+            results[i] = result
+    if tracker is not None:
+        for i in todo:
+            if results[i].get('evaluation') is not None:
+                tracker.record(tracker.item_key(pairs[i]['prompt'], pairs[i]['response']), pair_query(pairs[i]),
+                               pairs[i]['response'])
+        tracker.save()
+        print(tracker.summary(len(pairs)))
     # with open(output_filepath, 'w', encoding='utf-8') as f:
     #     for prompt, response in results.items():
     #         formatted_entry = format_prompt_evaluation(prompt, response)
     #         f.write(formatted_entry)
-    with open(output_filepath, 'w') as f:
-        json.dump(results, f, indent=4)
-
-def tally_results(input_file, output_file=None):
-    with open(input_file, 'r') as file:
-        data = json.load(file)
-    data_list = []
-    for prompt_response in data:
-        prompt = prompt_response['prompt']
-        evaluation = prompt_response['evaluation']
-        q1 = 1 if (evaluation[0]['answer'].lower() == 'yes') else 0
-        q2 = 1 if (evaluation[1]['answer'].lower() == 'yes') else 0
-        q3 = 1 if (evaluation[2]['answer'].lower() == 'yes') else 0
-        q4 = 1 if (evaluation[3]['answer'].lower() == 'yes') else 0
-        data_list.append((prompt, q1, q2, q3, q4))
-    df = pd.DataFrame(data_list, columns=['prompt', 'q1', 'q2', 'q3', 'q4'])
-    if output_file is not None:
-        df.to_csv(output_file, index=False)
-    for col in ['q1', 'q2', 'q3', 'q4']:
-        score = df[col].sum() / len(df[col])
-        print(f"Score for {col}: {score}")
+    write_results(output_filepath, results)
 
 
 topics_file = 'topics.txt'
 prompts_file = 'prompts_noisy.json'
 prompts_filtered_file = 'prompts_noisy_filtered.json'
-response_file = 'prompt_output_noisy.txt'
+filter_chunk_size = 25  # topics per filtering request
+response_file = 'prompt_output_noisy.jsonl'
+response_report_file = 'prompt_output_noisy.txt'
 metadata_file = 'current_metadata_official_urls_new.csv'
-evaluation_file = 'output_evaluation_noisy_with_json_metadata.json'
+evaluation_file = 'output_evaluation_noisy_with_json_metadata.jsonl'
 metrics_file = 'output_evaluation_scores_noisy_with_json_metadata.csv'
+resume = False  # set to True to skip prompts already recorded in the *.journal.jsonl files
+incremental = False  # set to True to rerun only prompts that are new or whose relevant measures changed
+metadata_mode = 'full'  # 'full' sends the whole metadata file, 'retrieval' only the top-k relevant measures
+metadata_top_k = 15
+metadata_encoding = 'json_indent'  # 'json_indent' (original), 'json_min' or 'csv'; see metadata_encoding.py
+metadata_drop_empty = False
+metadata_columns = None  # optional list of columns to keep
+evaluation_batch_size = 1  # > 1 judges several prompt/response pairs per request
+evaluation_judges = None  # e.g. [{'model': 'DeepSeek-R1', 'temperature': 0.6}] * 3 for majority voting
+evaluation_precheck = None  # 'focus' or 'skip' judges pairs failing the local URL check differently; see measure_index.py
+
+if __name__ == '__main__':
+    metadata_context = load_metadata_context(metadata_file, mode=metadata_mode, top_k=metadata_top_k,
+                                             encoding=metadata_encoding, drop_empty=metadata_drop_empty,
+                                             columns=metadata_columns)
 
-metadata_df = pd.read_csv(metadata_file)
-metadata_df = metadata_df[~metadata_df['newMeasureID'].isna()]
-metadata_df.set_index('newMeasureID', inplace=True)
-metadata_json = metadata_df.to_json(orient='index', indent=2)
-
-print('generating')
-#generate_prompts(topics_file, prompts_file)
-print('filtering')
-#filter_prompts(prompts_file, prompts_filtered_file)
-print('testing')
-test_prompts(prompts_filtered_file, response_file, metadata_json)
-print('evaluating')
-evaluate_prompts(response_file, evaluation_file, metadata_json)
-tally_results(evaluation_file)
+    print('generating')
+    #generate_prompts(topics_file, prompts_file)
+    print('filtering')
+    #filter_prompts(prompts_file, prompts_filtered_file, chunk_size=filter_chunk_size)
+    print('testing')
+    test_prompts(prompts_filtered_file, response_file, metadata_context, resume=resume,
+                 report_filepath=response_report_file, incremental=incremental)
+    print('evaluating')
+    evaluate_prompts(response_file, evaluation_file, metadata_context, resume=resume, batch_size=evaluation_batch_size,
+                     judges=evaluation_judges, incremental=incremental, precheck=evaluation_precheck)
+    tally_results(evaluation_file, measure_index=MeasureIndex(metadata_context.metadata_df))
+    runtime = get_runtime()
+    print(runtime.response_cache.summary())
+    print(runtime.prompt_cache_stats.summary())
+    runtime.telemetry.print_summary()
+    runtime.telemetry.write_summary()
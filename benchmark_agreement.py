@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import cohen_kappa_score
+from statsmodels.stats.inter_rater import fleiss_kappa
+
+from agreement import agreement_report
+
+
+def synthetic_review_sheet(n_items, n_raters, seed=0):
+    """A review sheet with n_raters human raters plus an LLM column per question."""
+    rng = np.random.default_rng(seed)
+    columns = {'Prompt': [f'prompt {i}' for i in range(n_items)]}
+    truth = rng.random((n_items, 4)) < 0.7
+    for rater in [f'R{r}' for r in range(n_raters)] + ['LLM']:
+        for q in range(4):
+            flipped = rng.random(n_items) < 0.15
+            answers = np.where(truth[:, q] ^ flipped, 'yes', 'no').astype(object)
+            answers[rng.random(n_items) < 0.02] = np.nan
+            columns[f'{rater}-{q + 1}'] = answers
+    return pd.DataFrame(columns)
+
+
+def legacy_agreement(df, raters):
+    """The previous approach: iterrows tables for Fleiss, one sklearn call per rater pair."""
+    for q in range(1, 5):
+        cols = [f'{rater}-{q}' for rater in raters]
+        rows = []
+        for _idx, row in df[cols].dropna().iterrows():
+            ratings = [str(r).lower() for r in row]
+            rows.append([ratings.count(cat) for cat in ('yes', 'no')])
+        fleiss_kappa(np.array(rows), method='fleiss')
+        for i, a in enumerate(cols):
+            for b in cols[i + 1:]:
+                pair = df[[a, b]].dropna()
+                cohen_kappa_score(pair[a].str.lower(), pair[b].str.lower())
+
+
+def benchmark(sizes=((300, 2), (3000, 4), (30000, 8), (300000, 8)), legacy_limit=30000):
+    print(f"{'items':>8} {'raters':>6} {'vectorized (s)':>15} {'legacy (s)':>11}")
+    for n_items, n_raters in sizes:
+        df = synthetic_review_sheet(n_items, n_raters)
+        start = time.perf_counter()
+        agreement_report(df)
+        vectorized = time.perf_counter() - start
+        legacy = None
+        if n_items <= legacy_limit:
+            start = time.perf_counter()
+            legacy_agreement(df, [f'R{r}' for r in range(n_raters)] + ['LLM'])
+            legacy = time.perf_counter() - start
+        legacy_text = f"{legacy:11.3f}" if legacy is not None else f"{'skipped':>11}"
+        print(f"{n_items:>8} {n_raters:>6} {vectorized:15.3f} {legacy_text}")
+
+
+if __name__ == '__main__':
+    benchmark()
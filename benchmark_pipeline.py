@@ -0,0 +1,111 @@
+import contextlib
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+import automated_query_generation as pipeline
+from metadata_retrieval import MetadataContext
+from mock_llm_server import MockLLMServer
+
+STAGES = ('generate', 'filter', 'test', 'evaluate', 'tally')
+# batched judging records its requests under a stage of its own
+TELEMETRY_STAGES = {'evaluate': ('evaluate', 'evaluate_batch')}
+
+
+def synthetic_metadata(n_measures, seed=0):
+    """A metadata table shaped like current_metadata_official_urls_new.csv."""
+    sources = ['EMS', 'Hospital discharge', 'Death certificates', 'Syndromic surveillance', 'PDMP']
+    topics = ['heroin', 'fentanyl', 'naloxone', 'buprenorphine', 'stimulants', 'prescriptions', 'overdose deaths']
+    rows = []
+    for i in range(n_measures):
+        topic = topics[(i + seed) % len(topics)]
+        source = sources[(i * 3 + seed) % len(sources)]
+        rows.append({'newMeasureID': f'M{i:04d}', 'measureName': f'{topic.title()} measure {i}',
+                     'source': source, 'description': f'Count of {topic} related events from {source} data.',
+                     'dashboardURL': f'https://dashboard.example.org/measures/M{i:04d}'})
+    return pd.DataFrame(rows)
+
+
+def write_config(filepath, base_url, max_concurrency):
+    with open(filepath, 'w') as f:
+        f.write(f"[API]\napi_key = mock\nbase_url = {base_url}\n\n"
+                f"[ENGINE]\nmax_concurrency = {max_concurrency}\nrequests_per_minute = 0\ninclude_usage = true\n\n"
+                "[CACHE]\nenabled = false\n\n"
+                "[RETRY]\nbase_delay = 0.05\nmax_delay = 1\nbreaker_reset = 0.5\n\n"
+                "[TELEMETRY]\nfilepath = telemetry.jsonl\n")
+
+
+def run_pipeline(n_topics=20, n_measures=200, max_concurrency=8, filter_chunk_size=10, evaluation_batch_size=1,
+                 metadata_mode='full', workdir=None, **server_settings):
+    """Runs generate -> filter -> test -> evaluate -> tally against a MockLLMServer.
+
+    Returns one row per stage with the wall time and the calls, failures, retries, latency
+    percentiles and token throughput recorded by telemetry for that stage. server_settings
+    are passed to MockLLMServer (latency, tokens_per_second, error_rate, malformed_rate, ...).
+    Without a workdir, the run's files go to a temporary directory that is removed afterwards.
+    """
+    previous_dir = os.getcwd()
+    rows = []
+    with contextlib.ExitStack() as stack:
+        if workdir is None:
+            # removed again when the run ends, after the working directory was restored
+            workdir = stack.enter_context(tempfile.TemporaryDirectory(prefix='pipeline_benchmark_'))
+        server = stack.enter_context(MockLLMServer(**server_settings))
+        os.chdir(workdir)
+        try:
+            write_config('config.ini', server.base_url, max_concurrency)
+            with open('topics.txt', 'w') as f:
+                f.write('\n'.join(f'topic {i}' for i in range(n_topics)) + '\n')
+            metadata_df = synthetic_metadata(n_measures).set_index('newMeasureID')
+            pipeline.configure(os.path.join(workdir, 'config.ini'))
+            metadata_context = MetadataContext(metadata_df, mode=metadata_mode)
+            stages = {
+                'generate': lambda: pipeline.generate_prompts('topics.txt', 'prompts.json', max_concurrency),
+                'filter': lambda: pipeline.filter_prompts('prompts.json', 'prompts_filtered.json', max_concurrency,
+                                                          chunk_size=filter_chunk_size),
+                'test': lambda: pipeline.test_prompts('prompts_filtered.json', 'responses.jsonl', metadata_context,
+                                                      max_concurrency),
+                'evaluate': lambda: pipeline.evaluate_prompts('responses.jsonl', 'evaluation.jsonl', metadata_context,
+                                                              max_concurrency, batch_size=evaluation_batch_size),
+                'tally': lambda: pipeline.tally_results('evaluation.jsonl', n_resamples=200),
+            }
+            for stage in STAGES:
+                start = time.perf_counter()
+                stages[stage]()
+                wall = time.perf_counter() - start
+                summary = pipeline.get_runtime().telemetry.summary(TELEMETRY_STAGES.get(stage, stage))
+                rows.append({'stage': stage, 'wall_s': wall, 'calls': summary['calls'],
+                             'failures': sum(summary['failures_by_type'].values()), 'retries': summary['retries'],
+                             'calls_per_s': summary['calls'] / wall if wall else None,
+                             'latency_p50': summary['latency_p50'], 'latency_p95': summary['latency_p95'],
+                             'ttft_p50': summary['ttft_p50'],
+                             'completion_tokens': summary['completion_tokens'],
+                             'tokens_per_s': summary['completion_tokens'] / wall if wall else None})
+        finally:
+            os.chdir(previous_dir)
+        print(f"Mock server: {dict(server.stats)}")
+    return pd.DataFrame(rows).set_index('stage')
+
+
+def benchmark(configurations=None, **settings):
+    """Runs the pipeline once per configuration (dicts of run_pipeline arguments) and prints each stage table."""
+    configurations = configurations or [
+        {'max_concurrency': 1},
+        {'max_concurrency': 8},
+        {'max_concurrency': 8, 'evaluation_batch_size': 5},
+        {'max_concurrency': 8, 'error_rate': 0.1, 'malformed_rate': 0.05},
+    ]
+    results = {}
+    for configuration in configurations:
+        label = ', '.join(f"{name}={value}" for name, value in configuration.items())
+        table = run_pipeline(**dict(settings, **configuration))
+        results[label] = table
+        print(f"\n{label}: {table['wall_s'].sum():.2f}s total")
+        print(table.to_string(float_format=lambda value: f"{value:.3f}"))
+    return results
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,141 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from agreement import cohens_kappa_matrix, fleiss_kappa_per_question
+
+DEFAULT_RESAMPLES = 2000
+DEFAULT_CHUNK_SIZE = 250
+
+
+def resample_weights(n_items, n_resamples, rng):
+    """(n_resamples, n_items) multiplicities of each item in each bootstrap resample."""
+    return rng.multinomial(n_items, np.full(n_items, 1 / n_items), size=n_resamples).astype(np.float64)
+
+
+def _run_chunk(statistic, n_items, n_resamples, seed):
+    rng = np.random.default_rng(seed)
+    return statistic(weights=resample_weights(n_items, n_resamples, rng))
+
+
+def bootstrap(statistic, n_items, n_resamples=DEFAULT_RESAMPLES, chunk_size=DEFAULT_CHUNK_SIZE, n_jobs=1, seed=0):
+    """Evaluates statistic(weights=...) on n_resamples bootstrap resamples of the items.
+
+    statistic receives a (resamples, items) weight array and returns one row per resample,
+    so every chunk of resamples is a single array operation. Chunks bound memory use and,
+    with n_jobs > 1, are spread over a process pool (statistic must then be picklable,
+    e.g. a functools.partial of a module-level function). Seeds are derived per chunk, so
+    results only depend on seed, not on n_jobs.
+    """
+    sizes = [min(chunk_size, n_resamples - start) for start in range(0, n_resamples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if n_jobs > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            chunks = list(executor.map(_run_chunk, [statistic] * len(sizes), [n_items] * len(sizes), sizes, seeds))
+    else:
+        chunks = [_run_chunk(statistic, n_items, size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+    return np.concatenate(chunks, axis=0)
+
+
+def percentile_interval(samples, alpha=0.05):
+    """Percentile confidence interval along the resample axis (NaN resamples are ignored)."""
+    with np.errstate(invalid='ignore'):
+        return (np.nanpercentile(samples, 100 * alpha / 2, axis=0),
+                np.nanpercentile(samples, 100 * (1 - alpha / 2), axis=0))
+
+
+def mean_statistic(values, weights):
+    """Weighted column means of an (items, columns) array, one row per resample (NaN values are left out)."""
+    present = ~np.isnan(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (weights @ np.where(present, values, 0.0)) / (weights @ present.astype(np.float64))
+
+
+def bootstrap_scores(scores_df, n_resamples=DEFAULT_RESAMPLES, alpha=0.05, n_jobs=1, seed=0):
+    """Mean of each 0/1 score column (e.g. q1-q4) with a bootstrap confidence interval.
+
+    NaN scores (questions that were not judged) only drop out of their own column.
+    """
+    values = scores_df.to_numpy(dtype=np.float64)
+    samples = bootstrap(partial(mean_statistic, values), len(values), n_resamples, n_jobs=n_jobs, seed=seed)
+    low, high = percentile_interval(samples, alpha)
+    present = ~np.isnan(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        score = np.where(present, values, 0.0).sum(axis=0) / present.sum(axis=0)
+    return pd.DataFrame({'score': score, 'ci_low': low, 'ci_high': high}, index=scores_df.columns)
+
+
+def bootstrap_fleiss_kappa(codes, n_resamples=DEFAULT_RESAMPLES, alpha=0.05, n_jobs=1, seed=0):
+    """Fleiss' kappa per question with bootstrap confidence intervals (items are resampled)."""
+    samples = bootstrap(partial(fleiss_kappa_per_question, codes), codes.shape[1], n_resamples,
+                        n_jobs=n_jobs, seed=seed)
+    low, high = percentile_interval(samples, alpha)
+    return pd.DataFrame({'kappa': fleiss_kappa_per_question(codes), 'ci_low': low, 'ci_high': high},
+                        index=[f'question_{q + 1}' for q in range(codes.shape[0])])
+
+
+def bootstrap_cohens_kappa(codes, raters, n_resamples=DEFAULT_RESAMPLES, alpha=0.05, n_jobs=1, seed=0):
+    """Cohen's kappa for every rater pair and question with bootstrap confidence intervals."""
+    samples = bootstrap(partial(cohens_kappa_matrix, codes), codes.shape[1], n_resamples,
+                        chunk_size=max(1, DEFAULT_CHUNK_SIZE // 5), n_jobs=n_jobs, seed=seed)
+    low, high = percentile_interval(samples, alpha)
+    point = cohens_kappa_matrix(codes)
+    rows = []
+    for q in range(codes.shape[0]):
+        for r in range(len(raters)):
+            for s in range(r + 1, len(raters)):
+                rows.append({'question': f'question_{q + 1}', 'rater_1': raters[r], 'rater_2': raters[s],
+                             'kappa': point[q, r, s], 'ci_low': low[q, r, s], 'ci_high': high[q, r, s]})
+    return pd.DataFrame(rows)
+
+
+def permutation_test(scores_a, scores_b, n_permutations=10000, seed=0):
+    """Two-sided permutation p-values for the difference in column means of two score tables.
+
+    Used to compare two evaluator or prompt variants; all permutations are drawn as one
+    (permutations, items) index array.
+    """
+    a = scores_a.to_numpy(dtype=np.float64)
+    b = scores_b.to_numpy(dtype=np.float64)
+    pooled = np.concatenate([a, b])
+    observed = a.mean(axis=0) - b.mean(axis=0)
+    rng = np.random.default_rng(seed)
+    permutations = rng.permuted(np.tile(np.arange(len(pooled)), (n_permutations, 1)), axis=1)
+    in_a = np.zeros((n_permutations, len(pooled)))
+    np.put_along_axis(in_a, permutations[:, :len(a)], 1.0, axis=1)
+    diffs = (in_a @ pooled) / len(a) - ((1 - in_a) @ pooled) / len(b)
+    p_values = ((np.abs(diffs) >= np.abs(observed) - 1e-12).sum(axis=0) + 1) / (n_permutations + 1)
+    return pd.DataFrame({'difference': observed, 'p_value': p_values}, index=scores_a.columns)
+
+
+def proportion_interval(successes, totals, alpha=0.05):
+    """Wilson score interval of successes / totals, elementwise (NaN where totals is 0).
+
+    Needs only the counts, so scores tallied without keeping the per-item values still get
+    a confidence interval.
+    """
+    successes = np.asarray(successes, dtype=np.float64)
+    totals = np.asarray(totals, dtype=np.float64)
+    z = NormalDist().inv_cdf(1 - alpha / 2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = successes / totals
+        center = (p + z ** 2 / (2 * totals)) / (1 + z ** 2 / totals)
+        half = z * np.sqrt(p * (1 - p) / totals + z ** 2 / (4 * totals ** 2)) / (1 + z ** 2 / totals)
+    return center - half, center + half
+
+
+def two_proportion_test(successes_a, totals_a, successes_b, totals_b):
+    """Two-sided p-values of the pooled z-test for a difference between two proportions, elementwise."""
+    successes_a, totals_a, successes_b, totals_b = (np.asarray(value, dtype=np.float64) for value in
+                                                    (successes_a, totals_a, successes_b, totals_b))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pooled = (successes_a + successes_b) / (totals_a + totals_b)
+        se = np.sqrt(pooled * (1 - pooled) * (1 / totals_a + 1 / totals_b))
+        z = (successes_a / totals_a - successes_b / totals_b) / se
+    # identical all-yes or all-no runs have no variance and no difference
+    z = np.where(se == 0, 0.0, z)
+    return np.vectorize(lambda value: 2 * (1 - NormalDist().cdf(abs(value))) if value == value else np.nan,
+                        otypes=[np.float64])(z)
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import threading
+
+from measure_index import MeasureIndex
+from result_journal import text_hash
+
+
+def measure_hashes(metadata_df):
+    """Content hash of every measure's row, keyed by newMeasureID."""
+    records = json.loads(metadata_df.to_json(orient='index'))
+    return {measure_id: hashlib.sha256(json.dumps(record, sort_keys=True).encode('utf-8')).hexdigest()
+            for measure_id, record in records.items()}
+
+
+def diff_measures(previous, current):
+    """IDs of the measures added, removed or edited between two measure_hashes() results."""
+    return {measure_id for measure_id in previous.keys() | current.keys()
+            if previous.get(measure_id) != current.get(measure_id)}
+
+
+def metadata_settings(metadata_context):
+    """The MetadataContext options that change what is sent with each request."""
+    return {'mode': metadata_context.mode, 'top_k': metadata_context.top_k, 'encoding': metadata_context.encoding,
+            'drop_empty': metadata_context.drop_empty, 'columns': metadata_context.columns}
+
+
+class ChangeTracker:
+    """Decides which items of a rerun can reuse the previous run's output.
+
+    The manifest written next to a run's output holds a content hash of every measure and,
+    per item (e.g. a prompt), the measures the item depended on: the top_k (by default the
+    context's) retrieved for its query plus those its output cites (by URL, ID or name).
+    An item is reused when the run settings are unchanged, it was in the previous run, none
+    of its measures changed, and no other measure is now retrieved for it. Anything else (new prompts, changed settings,
+    a missing or unreadable manifest) is rerun.
+
+    digest identifies the settings and the content of every measure. Rerun items add it to
+    their journal keys, so a resumed run never reuses a journaled output produced against
+    other metadata.
+    """
+
+    def __init__(self, manifest_filepath, metadata_context, settings, top_k=None):
+        self.manifest_filepath = manifest_filepath
+        self.metadata_context = metadata_context
+        self.settings = settings
+        self.top_k = top_k
+        self.measures = measure_hashes(metadata_context.metadata_df)
+        self.digest = text_hash(json.dumps({'settings': settings, 'measures': self.measures}, sort_keys=True))
+        self.measure_index = MeasureIndex(metadata_context.metadata_df)
+        self.items = {}
+        self.reused = 0
+        self._lock = threading.Lock()
+        previous = self.load(manifest_filepath)
+        if previous is not None and previous.get('settings') == settings:
+            self.previous_items = previous['items']
+            self.changed = diff_measures(previous['measures'], self.measures)
+        else:
+            self.previous_items = {}
+            self.changed = None
+
+    @staticmethod
+    def load(filepath):
+        if not os.path.exists(filepath):
+            return None
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return None
+
+    @staticmethod
+    def item_key(*parts):
+        return text_hash('\n'.join(str(part) for part in parts))
+
+    def retrieved(self, query):
+        return set(self.metadata_context.relevant_measures(query, self.top_k))
+
+    def is_current(self, key, query):
+        """True if the previous output for key is still valid; it is then carried into the new manifest."""
+        previous = self.previous_items.get(key)
+        if previous is None or self.changed is None:
+            return False
+        depends_on = set(previous['measures'])
+        if depends_on & self.changed or not self.retrieved(query) <= depends_on:
+            return False
+        with self._lock:
+            self.items[key] = previous
+            self.reused += 1
+        return True
+
+    def record(self, key, query, output_text):
+        """Stores what a freshly produced output depends on."""
+        measures = self.retrieved(query) | set(self.measure_index.check_response(output_text)['measures'])
+        with self._lock:
+            self.items[key] = {'measures': sorted(measures)}
+
+    def save(self):
+        temp_filepath = f"{self.manifest_filepath}.{os.getpid()}.tmp"
+        with open(temp_filepath, 'w', encoding='utf-8') as f:
+            json.dump({'settings': self.settings, 'measures': self.measures, 'items': self.items}, f)
+        os.replace(temp_filepath, self.manifest_filepath)
+
+    def summary(self, total):
+        if self.changed is None:
+            return f"Incremental run: no usable manifest from a previous run, all {total} items run"
+        return (f"Incremental run: {len(self.changed)} measures changed, {self.reused} of {total} items reused, "
+                f"{total - self.reused} rerun")
@@ -0,0 +1,156 @@
+"""Command line entry point running each stage of the evaluation pipeline on its own.
+
+    python cli.py generate --topics topics.txt --output prompts_noisy.json
+    python cli.py filter --input prompts_noisy.json --output prompts_noisy_filtered.json
+    python cli.py test --input prompts_noisy_filtered.json --output prompt_output_noisy.jsonl
+    python cli.py evaluate --input prompt_output_noisy.jsonl --output evaluation.jsonl
+    python cli.py tally --input evaluation.jsonl
+    python cli.py trend --inputs runs/2024-01.jsonl runs/2024-02.jsonl --output-prefix trend
+    python cli.py agreement --review review.xlsx
+
+Modules are imported per subcommand, so tally, trend and agreement never load the OpenAI client,
+and the LLM stages only read config.ini and the metadata when they first need them.
+"""
+import argparse
+
+DEFAULT_METADATA_FILE = 'current_metadata_official_urls_new.csv'
+
+
+def add_llm_arguments(parser):
+    parser.add_argument('--config', default='config.ini', help="config.ini with the [API] endpoint and settings")
+    parser.add_argument('--max-concurrency', type=int, default=None,
+                        help="requests in flight at once (default: [ENGINE] max_concurrency)")
+
+
+def add_metadata_arguments(parser):
+    parser.add_argument('--metadata', default=DEFAULT_METADATA_FILE, help="metadata CSV")
+    parser.add_argument('--metadata-mode', choices=('full', 'retrieval'), default='full')
+    parser.add_argument('--metadata-top-k', type=int, default=15)
+    parser.add_argument('--metadata-encoding', choices=('json_indent', 'json_min', 'csv'), default='json_indent')
+    parser.add_argument('--metadata-drop-empty', action='store_true')
+    parser.add_argument('--model', default='DeepSeek-R1')
+    parser.add_argument('--resume', action='store_true', help="skip items already recorded in the journal")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only rerun items that are new or whose relevant measures changed since the last run")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="LLM evaluation pipeline for the RADOR metadata assistant")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate = subparsers.add_parser('generate', help="generate candidate prompts for each topic")
+    generate.add_argument('--topics', default='topics.txt')
+    generate.add_argument('--output', default='prompts_noisy.json')
+    add_llm_arguments(generate)
+
+    filter_ = subparsers.add_parser('filter', help="keep one prompt per topic")
+    filter_.add_argument('--input', default='prompts_noisy.json')
+    filter_.add_argument('--output', default='prompts_noisy_filtered.json')
+    filter_.add_argument('--chunk-size', type=int, default=25, help="topics per filtering request")
+    add_llm_arguments(filter_)
+
+    test = subparsers.add_parser('test', help="answer every prompt using the metadata")
+    test.add_argument('--input', default='prompts_noisy_filtered.json')
+    test.add_argument('--output', default='prompt_output_noisy.jsonl')
+    test.add_argument('--report', default=None, help="also render a PROMPT/RESPONSE text report")
+    test.add_argument('--parquet', default=None, help="also export the records to Parquet")
+    add_llm_arguments(test)
+    add_metadata_arguments(test)
+
+    evaluate = subparsers.add_parser('evaluate', help="judge every prompt/response pair")
+    evaluate.add_argument('--input', default='prompt_output_noisy.jsonl')
+    evaluate.add_argument('--output', default='output_evaluation_noisy_with_json_metadata.jsonl')
+    evaluate.add_argument('--batch-size', type=int, default=1, help="pairs judged per request")
+    evaluate.add_argument('--judges', type=int, default=1, help="judges per pair, aggregated by majority vote")
+    evaluate.add_argument('--temperature', type=float, default=None, help="judge sampling temperature")
+    evaluate.add_argument('--precheck', choices=('focus', 'skip'), default=None,
+                          help="run the local URL/measure check first and focus the judge on, or skip, failing pairs")
+    add_llm_arguments(evaluate)
+    add_metadata_arguments(evaluate)
+
+    tally = subparsers.add_parser('tally', help="score the evaluations with bootstrap confidence intervals")
+    tally.add_argument('--input', default='output_evaluation_noisy_with_json_metadata.jsonl')
+    tally.add_argument('--output', default=None, help="CSV of the per-prompt scores")
+    tally.add_argument('--resamples', type=int, default=2000)
+    tally.add_argument('--jobs', type=int, default=1)
+    tally.add_argument('--metadata', default=None, help="metadata CSV; adds the deterministic URL/measure checks")
+
+    trend = subparsers.add_parser('trend', help="per-run, per-question and per-topic scores over several runs")
+    trend.add_argument('--inputs', nargs='+', required=True, help="evaluation files, oldest run first")
+    trend.add_argument('--labels', nargs='+', default=None, help="run labels (default: file names)")
+    trend.add_argument('--output-prefix', default=None, help="write <prefix>_{runs,questions,topics,comparison}.csv")
+
+    agreement = subparsers.add_parser('agreement', help="inter-rater agreement of the review sheet")
+    agreement.add_argument('--review', default='review.xlsx')
+    agreement.add_argument('--sheet', default='Sheet1')
+    agreement.add_argument('--resamples', type=int, default=2000)
+    agreement.add_argument('--jobs', type=int, default=1)
+    return parser
+
+
+def metadata_context(args):
+    from metadata_retrieval import load_metadata_context
+
+    return load_metadata_context(args.metadata, mode=args.metadata_mode, top_k=args.metadata_top_k,
+                                 encoding=args.metadata_encoding, drop_empty=args.metadata_drop_empty)
+
+
+def run_llm_stage(args):
+    import automated_query_generation as pipeline
+
+    pipeline.configure(args.config)
+    if args.command == 'generate':
+        pipeline.generate_prompts(args.topics, args.output, args.max_concurrency)
+    elif args.command == 'filter':
+        pipeline.filter_prompts(args.input, args.output, args.max_concurrency, chunk_size=args.chunk_size)
+    elif args.command == 'test':
+        pipeline.test_prompts(args.input, args.output, metadata_context(args), args.max_concurrency, model=args.model,
+                              resume=args.resume, report_filepath=args.report, parquet_filepath=args.parquet,
+                              incremental=args.incremental)
+    elif args.command == 'evaluate':
+        judge = {'model': args.model}
+        if args.temperature is not None:
+            judge['temperature'] = args.temperature
+        pipeline.evaluate_prompts(args.input, args.output, metadata_context(args), args.max_concurrency,
+                                  model=args.model, resume=args.resume, batch_size=args.batch_size,
+                                  judges=[judge] * args.judges, incremental=args.incremental, precheck=args.precheck)
+    runtime = pipeline.get_runtime()
+    print(runtime.response_cache.summary())
+    print(runtime.prompt_cache_stats.summary())
+    runtime.telemetry.print_summary()
+    runtime.telemetry.write_summary()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == 'tally':
+        from tally import tally_results
+
+        measure_index = None
+        if args.metadata is not None:
+            from measure_index import MeasureIndex
+            from metadata_retrieval import read_metadata
+
+            measure_index = MeasureIndex(read_metadata(args.metadata))
+        tally_results(args.input, args.output, n_resamples=args.resamples, n_jobs=args.jobs,
+                      measure_index=measure_index)
+    elif args.command == 'trend':
+        from tally import tally_runs
+
+        if args.labels is not None and len(args.labels) != len(args.inputs):
+            print(f"Error: {len(args.labels)} labels for {len(args.inputs)} inputs")
+            return
+        tally_runs(args.inputs, args.labels, args.output_prefix)
+    elif args.command == 'agreement':
+        import pandas as pd
+
+        from calculate_agreement import print_agreement
+
+        print_agreement(pd.read_excel(args.review, sheet_name=args.sheet), n_resamples=args.resamples,
+                        n_jobs=args.jobs)
+    else:
+        run_llm_stage(args)
+
+
+if __name__ == '__main__':
+    main()
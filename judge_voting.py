@@ -0,0 +1,46 @@
+from collections import Counter
+
+QUESTION_COUNT = 4
+NOT_JUDGED = 'not judged'
+
+
+def answers(evaluation):
+    """The normalized yes/no answers of one judge's evaluation."""
+    return [str(item.get('answer', '')).strip().lower() for item in evaluation[:QUESTION_COUNT]]
+
+
+def is_valid_evaluation(evaluation, allow_not_judged=False):
+    """True if a judge output has a yes/no answer for each of the four questions.
+
+    With allow_not_judged, questions may also be answered NOT_JUDGED, as in the evaluations
+    recorded without a judge call for responses failing the local precheck.
+    """
+    if not isinstance(evaluation, list) or len(evaluation) < QUESTION_COUNT:
+        return False
+    allowed = ('yes', 'no', NOT_JUDGED) if allow_not_judged else ('yes', 'no')
+    return all(isinstance(item, dict) and str(item.get('answer', '')).lower() in allowed
+               for item in evaluation[:QUESTION_COUNT])
+
+
+def is_unanimous(evaluations):
+    """True if every judge gave the same answer to every question."""
+    return len({tuple(answers(evaluation)) for evaluation in evaluations}) <= 1
+
+
+def aggregate_votes(evaluations):
+    """Majority vote per question over several judges' evaluations.
+
+    Each question keeps the justification of the first judge in the majority and records the
+    vote counts and the agreement (share of judges in the majority). Ties resolve to 'no'.
+    """
+    aggregated = []
+    for q in range(QUESTION_COUNT):
+        votes = Counter(answers(evaluation)[q] for evaluation in evaluations)
+        top = max(votes.values())
+        winners = [answer for answer, count in votes.items() if count == top]
+        answer = winners[0] if len(winners) == 1 else 'no'
+        justification = next((evaluation[q].get('justification', '') for evaluation in evaluations
+                              if answers(evaluation)[q] == answer), '')
+        aggregated.append({'question': str(q + 1), 'answer': answer, 'justification': justification,
+                           'votes': dict(votes), 'agreement': votes[answer] / len(evaluations)})
+    return aggregated
@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_TOKENS_PER_MINUTE = 0  # 0 means no token limit
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    """Rough token estimate (~4 characters per token) used for rate limiting."""
+    return max(1, len(text) // 4)
+
+
+def estimate_message_tokens(messages):
+    """Estimates the input tokens of a chat.completions messages list."""
+    total = 0
+    for message in messages:
+        content = message['content']
+        if isinstance(content, str):
+            total += estimate_tokens(content)
+        else:
+            total += sum(estimate_tokens(part.get('text', '')) for part in content)
+    return total
+
+
+class RateLimiter:
+    """Sliding-window limiter for requests/min and tokens/min, shared across threads.
+
+    A limit of 0 or None disables that limit.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, window=60.0):
+        self.requests_per_minute = requests_per_minute or 0
+        self.tokens_per_minute = tokens_per_minute or 0
+        self.window = window
+        self._events = deque()  # (timestamp, tokens)
+        self._tokens_in_window = 0
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        while self._events and now - self._events[0][0] >= self.window:
+            _, tokens = self._events.popleft()
+            self._tokens_in_window -= tokens
+
+    def _wait_time(self, now, tokens):
+        wait = 0.0
+        if self.requests_per_minute and len(self._events) >= self.requests_per_minute:
+            index = len(self._events) - self.requests_per_minute
+            wait = max(wait, self._events[index][0] + self.window - now)
+        if self.tokens_per_minute and self._events and self._tokens_in_window + tokens > self.tokens_per_minute:
+            # Free the oldest events until the new request fits (a single oversized
+            # request is allowed through once the window is empty).
+            freed = self._tokens_in_window
+            for timestamp, event_tokens in self._events:
+                freed -= event_tokens
+                if freed + tokens <= self.tokens_per_minute:
+                    wait = max(wait, timestamp + self.window - now)
+                    break
+            else:
+                wait = max(wait, self._events[-1][0] + self.window - now)
+        return wait
+
+    def acquire(self, tokens=0):
+        """Blocks until a request of `tokens` input tokens fits in both limits."""
+        if not self.requests_per_minute and not self.tokens_per_minute:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._prune(now)
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    self._events.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+            time.sleep(wait)
+
+    def set_limits(self, requests_per_minute=None, tokens_per_minute=None):
+        """Changes the limits; requests already in the window still count against the new ones."""
+        with self._lock:
+            self.requests_per_minute = requests_per_minute or 0
+            self.tokens_per_minute = tokens_per_minute or 0
+
+
+def get_rate_limiter(endpoint, requests_per_minute=None, tokens_per_minute=None):
+    """Returns the shared RateLimiter for an endpoint, creating it on first use.
+
+    An existing limiter takes the given limits, so a reloaded config with new limits for
+    the same endpoint applies them while keeping the requests already made in the window.
+    """
+    with _rate_limiters_lock:
+        if endpoint not in _rate_limiters:
+            _rate_limiters[endpoint] = RateLimiter(requests_per_minute, tokens_per_minute)
+        else:
+            _rate_limiters[endpoint].set_limits(requests_per_minute, tokens_per_minute)
+        return _rate_limiters[endpoint]
+
+
+def load_engine_config(config):
+    """Reads the optional [ENGINE] section of config.ini."""
+    return {
+        'max_concurrency': config.getint('ENGINE', 'max_concurrency', fallback=DEFAULT_MAX_CONCURRENCY),
+        'requests_per_minute': config.getint('ENGINE', 'requests_per_minute', fallback=DEFAULT_REQUESTS_PER_MINUTE),
+        'tokens_per_minute': config.getint('ENGINE', 'tokens_per_minute', fallback=DEFAULT_TOKENS_PER_MINUTE),
+        'include_usage': config.getboolean('ENGINE', 'include_usage', fallback=True),
+        'usage_after_json': config.getboolean('ENGINE', 'usage_after_json', fallback=False),
+    }
+
+
+def run_in_order(fn, items, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """Runs fn(item) for every item on a bounded thread pool.
+
+    Results are returned in the same order as items, regardless of completion order. Rate
+    limits are applied per request in stream_completion, not here.
+    """
+    items = list(items)
+    if max_concurrency is None or max_concurrency <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        return list(executor.map(fn, items))
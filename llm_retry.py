@@ -0,0 +1,173 @@
+import email.utils
+import random
+import threading
+import time
+
+import openai
+
+try:
+    import httpx  # errors raised while iterating a stream are not wrapped by openai
+    _TRANSPORT_ERRORS = (httpx.TimeoutException, httpx.TransportError)
+except ImportError:
+    _TRANSPORT_ERRORS = ()
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+DEFAULT_CALL_TIMEOUT = 600.0
+DEFAULT_STREAM_IDLE_TIMEOUT = 120.0
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_RESET = 30.0
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CallTimeout(Exception):
+    """The whole call (including streaming) took longer than the per-call timeout."""
+
+
+def is_retryable(exc):
+    """Transient failures: rate limits, 5xx, timeouts, dropped connections and stalled streams."""
+    if isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError, CallTimeout) + _TRANSPORT_ERRORS):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def retry_after(exc):
+    """Seconds requested by a Retry-After (or retry-after-ms) response header, if any."""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        # an unparseable header must not hide the API error being retried
+        return None
+    return max(0.0, retry_at.timestamp() - time.time()) if retry_at is not None else None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, honouring Retry-After when the server sends it."""
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, exc):
+        """Seconds to wait before retrying after the given failed attempt (0-based), or None to give up."""
+        if attempt + 1 >= self.max_attempts or not is_retryable(exc):
+            return None
+        requested = retry_after(exc)
+        if requested is not None:
+            return min(requested, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Pauses every caller while the endpoint looks down.
+
+    After failure_threshold consecutive transient failures the circuit opens and wait()
+    blocks all callers for reset_timeout seconds. Then a single probe call is let through:
+    success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_BREAKER_THRESHOLD, reset_timeout=DEFAULT_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._condition = threading.Condition()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def wait(self):
+        with self._condition:
+            while self.opened_at is not None:
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining <= 0 and not self.probing:
+                    self.probing = True
+                    return
+                self._condition.wait(timeout=remaining if remaining > 0 else None)
+
+    def record_success(self):
+        with self._condition:
+            if self.opened_at is not None:
+                print("Circuit breaker closed, endpoint is responding again")
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+            self._condition.notify_all()
+
+    def record_failure(self):
+        with self._condition:
+            self.failures += 1
+            if self.probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+                print(f"Circuit breaker open after {self.failures} consecutive failures, "
+                      f"pausing requests for {self.reset_timeout}s")
+                self.opened_at = time.monotonic()
+                self.probing = False
+            self._condition.notify_all()
+
+
+def call_with_retry(fn, policy, breaker=None, on_retry=None):
+    """Calls fn() until it succeeds, the error is not transient, or attempts run out.
+
+    on_retry(attempt, exc, delay) is called before each backoff sleep.
+    """
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.wait()
+        try:
+            result = fn()
+        except Exception as e:
+            transient = is_retryable(e)
+            if breaker is not None:
+                if transient:
+                    breaker.record_failure()
+                else:
+                    # a non-transient error (e.g. a 400) still means the endpoint is up
+                    breaker.record_success()
+            delay = policy.delay(attempt, e)
+            if delay is None:
+                raise
+            if on_retry is not None:
+                on_retry(attempt, e, delay)
+            time.sleep(delay)
+            attempt += 1
+            continue
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+
+def load_retry_config(config):
+    """Reads the optional [RETRY] section of config.ini."""
+    return {
+        'max_attempts': config.getint('RETRY', 'max_attempts', fallback=DEFAULT_MAX_ATTEMPTS),
+        'base_delay': config.getfloat('RETRY', 'base_delay', fallback=DEFAULT_BASE_DELAY),
+        'max_delay': config.getfloat('RETRY', 'max_delay', fallback=DEFAULT_MAX_DELAY),
+        'call_timeout': config.getfloat('RETRY', 'call_timeout', fallback=DEFAULT_CALL_TIMEOUT),
+        'stream_idle_timeout': config.getfloat('RETRY', 'stream_idle_timeout', fallback=DEFAULT_STREAM_IDLE_TIMEOUT),
+        'breaker_threshold': config.getint('RETRY', 'breaker_threshold', fallback=DEFAULT_BREAKER_THRESHOLD),
+        'breaker_reset': config.getfloat('RETRY', 'breaker_reset', fallback=DEFAULT_BREAKER_RESET),
+    }
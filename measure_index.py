@@ -0,0 +1,200 @@
+import re
+import threading
+from urllib.parse import urlsplit
+
+from metadata_retrieval import DEFAULT_INDEX_FILEPATH, build_metadata_index, tokenize
+
+DEFAULT_RELEVANT_TOP_K = 5
+MIN_NAME_LENGTH = 6
+
+_url_pattern = re.compile(r"https?://[^\s\"'<>()\[\]{}`|]+")
+_id_pattern = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]*[A-Za-z0-9]")
+
+
+def extract_urls(text):
+    """URLs in text, without trailing punctuation."""
+    return [url.rstrip('.,;:!?*_') for url in _url_pattern.findall(text or '')]
+
+
+def normalize_url(url):
+    """Compares URLs without scheme, case of the host or trailing slash."""
+    parts = urlsplit(url)
+    path = parts.path.rstrip('/')
+    query = f"?{parts.query}" if parts.query else ''
+    return f"{parts.netloc.lower()}{path}{query}"
+
+
+def _is_id_like(value):
+    # purely numeric IDs would match any number in a response, so only IDs with letters are matched
+    return any(c.isalpha() for c in value) and any(c.isdigit() for c in value)
+
+
+def id_shape(value):
+    """The shape of an ID with its letters and digits generalised, e.g. 'M0012' -> 'a9999'."""
+    return re.sub(r'[0-9]', '9', re.sub(r'[A-Za-z]', 'a', value))
+
+
+def id_prefix(value):
+    """The lower-cased part of an ID before its first digit, e.g. 'OD0012' -> 'od'."""
+    return re.match(r'[^0-9]*', value).group(0).lower()
+
+
+class MeasureIndex:
+    """In-memory lookup of the metadata's measure IDs, names, dashboard URLs and sources.
+
+    check_response() finds every URL and measure mention in a response with dictionary
+    lookups only, so responses can be scored for hallucinated URLs and measures, cited
+    measures, source accuracy and coverage without an LLM call. Name and source columns are
+    the ones whose header contains 'name' / 'source' unless given explicitly; URLs are taken
+    from every field.
+    """
+
+    def __init__(self, metadata_df, name_columns=None, source_columns=None, index_filepath=DEFAULT_INDEX_FILEPATH,
+                 relevant_top_k=DEFAULT_RELEVANT_TOP_K):
+        if name_columns is None:
+            name_columns = [col for col in metadata_df.columns if 'name' in str(col).lower()]
+        if source_columns is None:
+            source_columns = [col for col in metadata_df.columns if 'source' in str(col).lower()]
+        self.metadata_df = metadata_df
+        self.index_filepath = index_filepath
+        self.relevant_top_k = relevant_top_k
+        self.ids = {}
+        self.urls = {}
+        self.names = {}
+        self.sources = {}
+        self.hosts = set()
+        self.id_shapes = set()
+        self.id_prefixes = set()
+        self._name_lengths = {}
+        for measure_id, row in metadata_df.iterrows():
+            measure_id = str(measure_id)
+            if _is_id_like(measure_id):
+                self.ids[measure_id.lower()] = measure_id
+                self.id_shapes.add(id_shape(measure_id))
+                if id_prefix(measure_id):
+                    self.id_prefixes.add(id_prefix(measure_id))
+            for value in row.values:
+                if isinstance(value, str):
+                    for url in extract_urls(value):
+                        self.urls.setdefault(normalize_url(url), measure_id)
+                        self.hosts.add(urlsplit(url).netloc.lower())
+            for col in name_columns:
+                name_tokens = tokenize(row[col]) if isinstance(row[col], str) else []
+                if len(' '.join(name_tokens)) >= MIN_NAME_LENGTH:
+                    self.names.setdefault(tuple(name_tokens), measure_id)
+                    self._name_lengths.setdefault(name_tokens[0], set()).add(len(name_tokens))
+            sources = [tokenize(row[col]) for col in source_columns if isinstance(row[col], str)]
+            self.sources[measure_id] = [' '.join(tokens) for tokens in sources if tokens]
+        self._retrieval = None
+        self._lock = threading.Lock()
+
+    def retrieval(self):
+        with self._lock:
+            if self._retrieval is None:
+                self._retrieval = build_metadata_index(self.metadata_df, self.index_filepath)
+            return self._retrieval
+
+    def named_measures(self, tokens):
+        """IDs of the measures whose full name appears in a token list."""
+        found = set()
+        for i, token in enumerate(tokens):
+            for length in self._name_lengths.get(token, ()):
+                measure_id = self.names.get(tuple(tokens[i:i + length]))
+                if measure_id is not None:
+                    found.add(measure_id)
+        return found
+
+    def check_response(self, response, prompt=None):
+        """Deterministic checks of one response against the metadata.
+
+        URLs are valid (a measure's URL), invalid (on a dashboard host but not in the
+        metadata) or external (other sites). Measures count as cited by URL, ID or full name.
+        unknown_measures are tokens shaped like the metadata's IDs (see id_shape) that are not
+        measures in the metadata: in the path of an invalid URL, or elsewhere (text, external
+        URLs) only when they also start with one of the metadata's ID prefixes (see id_prefix),
+        so e.g. 'FY2020' is not taken for a measure ID like 'OD0001'.
+        The response is hallucinated if it has invalid URLs or unknown measures.
+        source_accuracy is the share of cited measures whose source is also named in the
+        response. With the prompt, coverage is the share of the relevant_top_k measures
+        retrieved for it that the response cites.
+        """
+        response = response or ''
+        valid, invalid, external = [], [], []
+        cited = set()
+        unknown = set()
+        id_tokens = []  # (token, found in an invalid dashboard URL)
+        for url in extract_urls(response):
+            measure_id = self.urls.get(normalize_url(url))
+            if measure_id is not None:
+                valid.append(url)
+                cited.add(measure_id)
+                continue
+            on_dashboard = urlsplit(url).netloc.lower() in self.hosts
+            if on_dashboard:
+                invalid.append(url)
+            else:
+                external.append(url)
+            id_tokens += [(token, on_dashboard) for token in _id_pattern.findall(urlsplit(url).path)]
+        text_without_urls = _url_pattern.sub(' ', response)
+        id_tokens += [(token, False) for token in _id_pattern.findall(text_without_urls)]
+        for token, in_invalid_url in id_tokens:
+            measure_id = self.ids.get(token.lower())
+            if measure_id is not None:
+                cited.add(measure_id)
+            elif (_is_id_like(token) and id_shape(token) in self.id_shapes
+                  and (in_invalid_url or id_prefix(token) in self.id_prefixes)):
+                unknown.add(token)
+        tokens = tokenize(text_without_urls)
+        cited |= self.named_measures(tokens)
+        text = ' '.join(tokens)
+        sourced = [measure_id for measure_id in cited
+                   if any(source and f" {source} " in f" {text} " for source in self.sources.get(measure_id, ()))]
+        check = {
+            'valid_urls': valid,
+            'invalid_urls': invalid,
+            'external_urls': external,
+            'measures': sorted(cited),
+            'unknown_measures': sorted(unknown),
+            'hallucinated': bool(invalid or unknown),
+            'source_accuracy': len(sourced) / len(cited) if cited else None,
+            'coverage': None,
+        }
+        if prompt is not None:
+            relevant = self.retrieval().search(prompt, self.relevant_top_k)
+            if relevant:
+                check['coverage'] = len(cited.intersection(relevant)) / len(relevant)
+        return check
+
+    def findings(self, check):
+        """A short note on a failed check, added to the judge prompt when focusing on it."""
+        notes = []
+        if check['invalid_urls']:
+            notes.append(f"these dashboard URLs in the response are not in the metadata: "
+                         f"{', '.join(check['invalid_urls'])}")
+        if check['unknown_measures']:
+            notes.append(f"these measure IDs in the response are not in the metadata: "
+                         f"{', '.join(check['unknown_measures'])}")
+        if check['measures']:
+            notes.append(f"measures cited: {', '.join(check['measures'])}")
+        return '; '.join(notes)
+
+
+def response_scores(records, measure_index):
+    """Per-record deterministic scores of the responses in test or evaluation records.
+
+    Columns: prompt, no_invalid_urls, no_unknown_measures and cites_measure (0/1),
+    coverage and source_accuracy (NaN when undefined); records without a response are left out.
+    """
+    import pandas as pd
+
+    rows = []
+    for record in records:
+        if record.get('response') is None:
+            continue
+        check = measure_index.check_response(record['response'], record.get('prompt'))
+        rows.append({'prompt': record.get('prompt'), 'no_invalid_urls': int(not check['invalid_urls']),
+                     'no_unknown_measures': int(not check['unknown_measures']),
+                     'cites_measure': int(bool(check['measures'])), 'coverage': check['coverage'],
+                     'source_accuracy': check['source_accuracy']})
+    columns = ['prompt', 'no_invalid_urls', 'no_unknown_measures', 'cites_measure', 'coverage', 'source_accuracy']
+    return pd.DataFrame(rows, columns=columns).astype({col: float for col in columns[1:]})
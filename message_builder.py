@@ -0,0 +1,56 @@
+import threading
+
+
+def build_messages(system_prompt, user_text, metadata_text=None, metadata_filename='metadata.json'):
+    """Builds chat messages with the static content first and the per-request text last.
+
+    The system prompt and the metadata file block form a byte-identical prefix across calls
+    (as long as the metadata text is the same, i.e. not in retrieval mode), which lets
+    providers with prompt/KV caching reuse it.
+    """
+    content = []
+    if metadata_text is not None:
+        content.append({"type": "text",
+                        "text": f"[file name]: {metadata_filename}\n[file content begin]{metadata_text}[file content end]"})
+    content.append({"type": "text", "text": user_text})
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": content},
+    ]
+
+
+def cached_prompt_tokens(usage):
+    """Cached input tokens reported in a usage object (OpenAI or DeepSeek field names)."""
+    if usage is None:
+        return 0
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached = getattr(details, 'cached_tokens', None) if details is not None else None
+    if cached is None:
+        cached = getattr(usage, 'prompt_cache_hit_tokens', None)
+    return cached or 0
+
+
+class PromptCacheStats:
+    """Thread-safe totals of prompt and cached prompt tokens across calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.calls_with_usage = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, usage):
+        with self._lock:
+            self.calls += 1
+            if usage is None:
+                return
+            self.calls_with_usage += 1
+            self.prompt_tokens += getattr(usage, 'prompt_tokens', 0) or 0
+            self.cached_tokens += cached_prompt_tokens(usage)
+
+    def summary(self):
+        with self._lock:
+            hit_rate = self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+            return (f"Prompt cache: {self.cached_tokens}/{self.prompt_tokens} prompt tokens cached "
+                    f"({hit_rate:.1%}) over {self.calls_with_usage}/{self.calls} calls reporting usage")
@@ -0,0 +1,84 @@
+import json
+import math
+
+from llm_engine import estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to the ~4 characters/token estimate
+    tiktoken = None
+
+ENCODINGS = ('json_indent', 'json_min', 'csv')
+ENCODING_EXTENSIONS = {'json_indent': '.json', 'json_min': '.json', 'csv': '.csv'}
+
+
+def _is_empty(value):
+    if value is None:
+        return True
+    if isinstance(value, float) and math.isnan(value):
+        return True
+    return isinstance(value, str) and not value.strip()
+
+
+def encode_metadata(metadata_df, encoding='json_indent', drop_empty=False, columns=None):
+    """Serializes the metadata for a prompt.
+
+    json_indent: the original to_json(orient='index', indent=2) layout.
+    json_min: minified JSON keyed by measure ID.
+    csv: column header written once, one line per measure.
+    drop_empty removes NaN/blank fields (whole empty columns for csv); columns keeps only
+    the listed columns.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown metadata encoding '{encoding}', expected one of {ENCODINGS}")
+    if columns is not None:
+        metadata_df = metadata_df[[col for col in columns if col in metadata_df.columns]]
+    if encoding == 'csv':
+        if drop_empty:
+            metadata_df = metadata_df.dropna(axis=1, how='all')
+        return metadata_df.to_csv(lineterminator='\n')
+    if not drop_empty:
+        if encoding == 'json_indent':
+            return metadata_df.to_json(orient='index', indent=2)
+        return metadata_df.to_json(orient='index')
+    records = json.loads(metadata_df.to_json(orient='index'))
+    records = {measure_id: {key: value for key, value in record.items() if not _is_empty(value)}
+               for measure_id, record in records.items()}
+    if encoding == 'json_indent':
+        return json.dumps(records, indent=2, ensure_ascii=False)
+    return json.dumps(records, separators=(',', ':'), ensure_ascii=False)
+
+
+def count_tokens(text, model_encoding='cl100k_base'):
+    """Token count with tiktoken when it is installed, otherwise an estimate."""
+    if tiktoken is None:
+        return estimate_tokens(text)
+    return len(tiktoken.get_encoding(model_encoding).encode(text))
+
+
+def encoding_report(metadata_df, columns=None):
+    """Size of the metadata under every encoding, with and without empty fields."""
+    rows = []
+    for encoding in ENCODINGS:
+        for drop_empty in (False, True):
+            text = encode_metadata(metadata_df, encoding, drop_empty, columns)
+            rows.append({'encoding': encoding, 'drop_empty': drop_empty,
+                         'characters': len(text), 'tokens': count_tokens(text)})
+    baseline = rows[0]['tokens']
+    for row in rows:
+        row['relative'] = round(row['tokens'] / baseline, 3) if baseline else None
+    return rows
+
+
+def print_encoding_report(metadata_df, columns=None):
+    if tiktoken is None:
+        print("tiktoken not installed, token counts are estimates (~4 characters per token)")
+    for row in encoding_report(metadata_df, columns):
+        print(f"{row['encoding']:<12} drop_empty={str(row['drop_empty']):<5} "
+              f"characters={row['characters']:<9} tokens={row['tokens']:<8} relative={row['relative']}")
+
+
+if __name__ == '__main__':
+    from metadata_retrieval import read_metadata
+
+    print_encoding_report(read_metadata('current_metadata_official_urls_new.csv'))
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from metadata_encoding import ENCODING_EXTENSIONS, encode_metadata
+
+DEFAULT_INDEX_FILEPATH = 'metadata_bm25_index.json'
+DEFAULT_METADATA_CACHE_DIR = '.metadata_cache'
+DEFAULT_TOP_K = 15
+
+_token_pattern = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return _token_pattern.findall(str(text).lower())
+
+
+def row_text(measure_id, row):
+    """Text of a metadata row used for retrieval: the measure ID plus every non-empty field."""
+    values = [str(value) for value in row.values if isinstance(value, str) or not _is_nan(value)]
+    return f"{measure_id} " + ' '.join(values)
+
+
+def _is_nan(value):
+    return isinstance(value, float) and math.isnan(value)
+
+
+class BM25Index:
+    """Okapi BM25 index over the metadata rows, one document per measure."""
+
+    def __init__(self, doc_ids, doc_term_freqs, fingerprint=None, k1=1.5, b=0.75):
+        self.doc_ids = doc_ids
+        self.doc_term_freqs = doc_term_freqs
+        self.fingerprint = fingerprint
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths = [sum(tf.values()) for tf in doc_term_freqs]
+        self.avg_doc_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        doc_freqs = Counter()
+        self.postings = {}
+        for doc_index, tf in enumerate(doc_term_freqs):
+            for term, freq in tf.items():
+                doc_freqs[term] += 1
+                self.postings.setdefault(term, []).append((doc_index, freq))
+        n = len(doc_ids)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freqs.items()}
+
+    @classmethod
+    def from_documents(cls, doc_ids, documents, fingerprint=None):
+        return cls(list(doc_ids), [dict(Counter(tokenize(doc))) for doc in documents], fingerprint)
+
+    def search(self, query, top_k=DEFAULT_TOP_K):
+        """Returns the IDs of the top_k highest scoring documents for query."""
+        scores = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_index, freq in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_index] / self.avg_doc_length)
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * freq * (self.k1 + 1) / (freq + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+        return [self.doc_ids[doc_index] for doc_index, _ in ranked]
+
+    def save(self, filepath):
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': self.fingerprint, 'doc_ids': self.doc_ids,
+                       'doc_term_freqs': self.doc_term_freqs}, f)
+
+    @classmethod
+    def load(cls, filepath):
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['doc_ids'], data['doc_term_freqs'], data['fingerprint'])
+
+
+def build_metadata_index(metadata_df, index_filepath=DEFAULT_INDEX_FILEPATH):
+    """Loads the persisted index if it was built from the same metadata, otherwise rebuilds and saves it."""
+    doc_ids = [str(measure_id) for measure_id in metadata_df.index]
+    documents = [row_text(measure_id, row) for measure_id, row in metadata_df.iterrows()]
+    fingerprint = hashlib.sha256('\n'.join(documents).encode('utf-8')).hexdigest()
+    if index_filepath and os.path.exists(index_filepath):
+        try:
+            index = BM25Index.load(index_filepath)
+            if index.fingerprint == fingerprint:
+                return index
+        except (json.JSONDecodeError, KeyError):
+            pass
+    index = BM25Index.from_documents(doc_ids, documents, fingerprint)
+    if index_filepath:
+        index.save(index_filepath)
+    return index
+
+
+def read_metadata(filepath):
+    """Reads the metadata CSV, keeping measures with a newMeasureID, indexed by it."""
+    import pandas as pd
+
+    metadata_df = pd.read_csv(filepath)
+    metadata_df = metadata_df[~metadata_df['newMeasureID'].isna()]
+    return metadata_df.set_index('newMeasureID')
+
+
+class MetadataContext:
+    """Supplies the metadata text sent with each request.
+
+    mode='full' sends the whole metadata file (the baseline); mode='retrieval' sends only
+    the top_k measures retrieved for the query, so answer quality can be compared.
+    encoding, drop_empty and columns are passed to metadata_encoding.encode_metadata.
+
+    Pass either metadata_df or a metadata_filepath to the CSV. Everything is built on first
+    use. With a metadata_filepath, the serialized full text is also cached in cache_dir,
+    keyed by the CSV's path, modification time and size and the encoding options.
+    """
+
+    def __init__(self, metadata_df=None, mode='full', top_k=DEFAULT_TOP_K, index_filepath=DEFAULT_INDEX_FILEPATH,
+                 encoding='json_indent', drop_empty=False, columns=None, metadata_filepath=None,
+                 cache_dir=DEFAULT_METADATA_CACHE_DIR):
+        if mode not in ('full', 'retrieval'):
+            raise ValueError(f"Unknown metadata mode '{mode}', expected 'full' or 'retrieval'")
+        if encoding not in ENCODING_EXTENSIONS:
+            raise ValueError(f"Unknown metadata encoding '{encoding}', expected one of {tuple(ENCODING_EXTENSIONS)}")
+        if metadata_df is None and metadata_filepath is None:
+            raise ValueError("MetadataContext needs metadata_df or metadata_filepath")
+        self.mode = mode
+        self.top_k = top_k
+        self.index_filepath = index_filepath
+        self.encoding = encoding
+        self.drop_empty = drop_empty
+        self.columns = columns
+        self.metadata_filepath = metadata_filepath
+        self.cache_dir = cache_dir
+        self.extension = ENCODING_EXTENSIONS[encoding]
+        self.filename = f"metadata{self.extension}"
+        self._metadata_df = metadata_df
+        self._full_text = None
+        self._index = None
+        self._positions = None
+        self._lock = threading.RLock()
+
+    @property
+    def metadata_df(self):
+        with self._lock:
+            if self._metadata_df is None:
+                self._metadata_df = read_metadata(self.metadata_filepath)
+            return self._metadata_df
+
+    @property
+    def full_text(self):
+        with self._lock:
+            if self._full_text is None:
+                cache_filepath = self.cache_filepath()
+                if cache_filepath is not None and os.path.exists(cache_filepath):
+                    with open(cache_filepath, 'r', encoding='utf-8') as f:
+                        self._full_text = f.read()
+                else:
+                    self._full_text = self.encode(self.metadata_df)
+                    if cache_filepath is not None:
+                        os.makedirs(self.cache_dir, exist_ok=True)
+                        temp_filepath = f"{cache_filepath}.{os.getpid()}.tmp"
+                        with open(temp_filepath, 'w', encoding='utf-8') as f:
+                            f.write(self._full_text)
+                        os.replace(temp_filepath, cache_filepath)
+            return self._full_text
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = build_metadata_index(self.metadata_df, self.index_filepath)
+                self._positions = {str(measure_id): i for i, measure_id in enumerate(self.metadata_df.index)}
+            return self._index
+
+    def cache_filepath(self):
+        """Where the serialized full text of metadata_filepath is cached, or None if it isn't."""
+        if self.metadata_filepath is None or not self.cache_dir:
+            return None
+        stat = os.stat(self.metadata_filepath)
+        key = json.dumps([os.path.abspath(self.metadata_filepath), stat.st_mtime_ns, stat.st_size,
+                          self.encoding, self.drop_empty, self.columns])
+        stem = os.path.splitext(os.path.basename(self.metadata_filepath))[0]
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{stem}-{digest}{self.extension}")
+
+    def encode(self, metadata_df):
+        return encode_metadata(metadata_df, self.encoding, self.drop_empty, self.columns)
+
+    def relevant_measures(self, query, top_k=None):
+        """IDs of the measures retrieved for query (the index is built in either mode)."""
+        return self.index.search(query, top_k or self.top_k)
+
+    def for_query(self, query):
+        return self.for_queries([query])
+
+    def for_queries(self, queries):
+        """Metadata text for several queries at once: the union of each query's top_k measures."""
+        if self.mode == 'full':
+            return self.full_text
+        measure_ids = list(dict.fromkeys(measure_id for query in queries
+                                         for measure_id in self.relevant_measures(query)))
+        subset = self.metadata_df.iloc[[self._positions[measure_id] for measure_id in measure_ids]]
+        return self.encode(subset)
+
+
+def load_metadata_context(metadata_filepath, **options):
+    """A MetadataContext for the metadata CSV; nothing is read until the first request needs it."""
+    return MetadataContext(metadata_filepath=metadata_filepath, **options)
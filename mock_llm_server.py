@@ -0,0 +1,271 @@
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_LATENCY = 0.2
+DEFAULT_TOKENS_PER_SECOND = 200.0
+DEFAULT_THINK_TOKENS = 64
+
+_url_pattern = re.compile(r"https?://[^\s\"',;)\]}]+")
+_filler = ('the', 'measure', 'data', 'source', 'dashboard', 'overdose', 'county', 'rate', 'metadata', 'question',
+           'user', 'relevant', 'check', 'opioid', 'emergency', 'visits', 'deaths', 'so', 'maybe', 'also')
+
+
+def tokenize_output(text):
+    """Splits text into roughly token-sized pieces (a word plus its trailing whitespace)."""
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+def message_text(message):
+    content = message.get('content')
+    if isinstance(content, list):
+        return ''.join(part.get('text', '') for part in content if isinstance(part, dict))
+    return content or ''
+
+
+def filler_text(rng, n_tokens):
+    return ' '.join(rng.choice(_filler) for _ in range(n_tokens))
+
+
+def json_block(data, rng, malformed):
+    text = json.dumps(data, indent=2)
+    if malformed:
+        # truncated JSON, still inside the fence, as models sometimes produce
+        text = text[:rng.randint(1, max(1, len(text) - 2))]
+    return f"```json\n{text}\n```"
+
+
+def evaluation(rng, yes_rate=0.75):
+    items = []
+    for q in range(1, 5):
+        answer = 'yes' if rng.random() < yes_rate else 'no'
+        items.append({'question': str(q), 'answer': answer,
+                      'justification': '' if answer == 'yes' else filler_text(rng, 12)})
+    return items
+
+
+def mock_answer(system_prompt, user_text, rng, malformed=False, hallucinate=False):
+    """The deterministic stand-in answer for one request, recognising each pipeline stage by its prompts."""
+    if 'generate prompts' in system_prompt:
+        match = re.search(r"The topic is: (.*)", user_text)
+        topic = match.group(1).strip() if match else 'opioids'
+        return json_block({'prompt_1': f"What measures track {topic}?", 'prompt_2': f"{topic} data",
+                           'prompt_3': f"Where can I find county-level numbers on {topic}?"}, rng, malformed)
+    if 'filter these down' in system_prompt:
+        match = re.search(r"\[file content begin\](.*)\[file content end\]", user_text, re.DOTALL)
+        try:
+            entries = json.loads(match.group(1)) if match else []
+        except json.JSONDecodeError:
+            entries = []
+        chosen = []
+        for entry in entries:
+            prompts = [value for key, value in sorted(entry.items()) if key.startswith('prompt_')]
+            if prompts:
+                chosen.append({'topic': entry.get('topic'), 'prompt': rng.choice(prompts)})
+        return json_block(chosen, rng, malformed)
+    if 'several prompt/response pairs' in system_prompt:
+        items = re.findall(r"ITEM: (item_\d+)", user_text)
+        return json_block({item: evaluation(rng) for item in items}, rng, malformed)
+    if 'evaluate a prompt/response pair' in system_prompt:
+        return json_block(evaluation(rng), rng, malformed)
+    # URLs in the JSON-encoded metadata have escaped slashes
+    urls = list(dict.fromkeys(_url_pattern.findall(user_text.replace('\\/', '/'))))
+    mentioned = rng.sample(urls, min(3, len(urls))) if urls else []
+    lines = [f"The most relevant measures for this question are listed below. {filler_text(rng, 20)}."]
+    lines += [f"- See the dashboard at {url}" for url in mentioned]
+    if hallucinate and urls:
+        lines.append(f"- See also {urls[0].rsplit('/', 1)[0]}/made-up-measure-{rng.randint(1000, 9999)}")
+    return '\n'.join(lines)
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients dropping idle keep-alive connections is expected, not worth a traceback
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class MockLLMServer:
+    """Local stand-in for an OpenAI-compatible chat-completions endpoint (DeepSeek-R1 style).
+
+    Answers are deterministic for a given seed, request and attempt number, so benchmark runs
+    are reproducible. Streaming responses are paced by latency (seconds before the first token)
+    and tokens_per_second (0 streams as fast as possible), and reasoning models put a
+    <think> block of think_tokens words before the answer. error_rate injects error_status
+    responses with a Retry-After header, malformed_rate truncates the JSON in an answer and
+    hallucination_rate adds a made-up dashboard URL to answers.
+
+    Use it as a context manager, or call start() and stop(); base_url is the value for the
+    [API] base_url setting.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=DEFAULT_LATENCY, tokens_per_second=DEFAULT_TOKENS_PER_SECOND,
+                 think_tokens=DEFAULT_THINK_TOKENS, error_rate=0.0, error_status=429, retry_after=0.1,
+                 malformed_rate=0.0, hallucination_rate=0.0, prompt_cache_rate=0.0, seed=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.think_tokens = think_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.malformed_rate = malformed_rate
+        self.hallucination_rate = hallucination_rate
+        self.prompt_cache_rate = prompt_cache_rate
+        self.seed = seed
+        self.stats = Counter()
+        self._attempts = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.httpd = _QuietHTTPServer((host, port), self._handler())
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def request_rng(self, body):
+        """An RNG seeded by the request and how many times it was seen, so retries can succeed."""
+        digest = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            attempt = self._attempts[digest]
+            self._attempts[digest] += 1
+            self.stats['requests'] += 1
+        return random.Random(f"{self.seed}:{digest}:{attempt}")
+
+    def completion(self, request, rng):
+        """(reasoning text, answer text) for a chat.completions request body."""
+        messages = request.get('messages', [])
+        system_prompt = ' '.join(message_text(m) for m in messages if m.get('role') == 'system')
+        user_text = '\n'.join(message_text(m) for m in messages if m.get('role') != 'system')
+        malformed = rng.random() < self.malformed_rate
+        if malformed:
+            with self._lock:
+                self.stats['malformed'] += 1
+        hallucinate = rng.random() < self.hallucination_rate
+        think = f"<think>\n{filler_text(rng, self.think_tokens)}\n</think>\n\n" if self.think_tokens else ''
+        return think, mock_answer(system_prompt, user_text, rng, malformed, hallucinate)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, data, headers=None):
+                payload = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def write_chunk(self, data):
+                payload = f"data: {json.dumps(data)}\n\n".encode('utf-8') if data is not None else b"data: [DONE]\n\n"
+                self.wfile.write(f"{len(payload):X}\r\n".encode('ascii') + payload + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self.send_json(404, {'error': {'message': f"Unknown path {self.path}", 'type': 'not_found'}})
+                    return
+                try:
+                    request = json.loads(body)
+                except json.JSONDecodeError as e:
+                    self.send_json(400, {'error': {'message': str(e), 'type': 'invalid_request_error'}})
+                    return
+                rng = server.request_rng(body)
+                if rng.random() < server.error_rate:
+                    with server._lock:
+                        server.stats[f'error_{server.error_status}'] += 1
+                    self.send_json(server.error_status,
+                                   {'error': {'message': 'Injected error', 'type': 'mock_error',
+                                              'code': server.error_status}},
+                                   headers={'retry-after': str(server.retry_after)})
+                    return
+                think, answer = server.completion(request, rng)
+                prompt_tokens = max(1, len(body) // 4)
+                usage = {'prompt_tokens': prompt_tokens,
+                         'completion_tokens': len(tokenize_output(think + answer)),
+                         'total_tokens': prompt_tokens + len(tokenize_output(think + answer)),
+                         'prompt_tokens_details': {'cached_tokens': int(prompt_tokens * server.prompt_cache_rate)}}
+                base = {'id': f"chatcmpl-{rng.getrandbits(64):x}", 'created': int(time.time()),
+                        'model': request.get('model', 'mock')}
+                if not request.get('stream'):
+                    time.sleep(server.latency)
+                    self.send_json(200, dict(base, object='chat.completion', usage=usage, choices=[
+                        {'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': think + answer}}]))
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    self.stream(request, base, tokenize_output(think + answer), usage)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client stopped reading (e.g. closed the stream once the JSON was complete)
+                    with server._lock:
+                        server.stats['closed_early'] += 1
+                    self.close_connection = True
+
+            def stream(self, request, base, tokens, usage):
+                base = dict(base, object='chat.completion.chunk')
+                start = time.monotonic() + server.latency
+                self.write_chunk(dict(base, choices=[{'index': 0, 'delta': {'role': 'assistant', 'content': ''},
+                                                      'finish_reason': None}]))
+                for i, token in enumerate(tokens):
+                    due = start + (i / server.tokens_per_second if server.tokens_per_second else 0)
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    self.write_chunk(dict(base, choices=[{'index': 0, 'delta': {'content': token},
+                                                          'finish_reason': None}]))
+                self.write_chunk(dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]))
+                if (request.get('stream_options') or {}).get('include_usage'):
+                    self.write_chunk(dict(base, choices=[], usage=usage))
+                self.write_chunk(None)
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+if __name__ == '__main__':
+    # point config.ini's [API] base_url at the printed URL to run the pipeline offline
+    port = 8000
+    with MockLLMServer(port=port) as mock_server:
+        print(f"Mock chat-completions endpoint at {mock_server.base_url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_CACHE_DIR = '.llm_cache'
+DEFAULT_MAX_SIZE_MB = 512
+DEFAULT_MAX_AGE_DAYS = 30
+
+
+def cache_key(model, messages, params=None):
+    """Content hash of everything that determines a completion."""
+    payload = json.dumps({'model': model, 'messages': messages, 'params': params or {}},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """On-disk cache of completion text, one JSON file per key.
+
+    bypass: neither read nor write the cache.
+    refresh: ignore existing entries but store the new completions.
+    Entries written more than max_age_days ago are ignored, however often they are read:
+    the file mtime is the write time and a hit only updates the access time. Eviction runs
+    when the cache is opened and only needs os.stat: expired entries are removed, then least
+    recently used ones (by access time) until under max_size_mb.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size_mb=DEFAULT_MAX_SIZE_MB,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS, bypass=False, refresh=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb else 0
+        self.max_age = max_age_days * 86400 if max_age_days else 0
+        self.bypass = bypass
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if not bypass:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.evict()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        if self.bypass or self.refresh:
+            return None
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            now = time.time()
+            if self.max_age and now - stat.st_mtime > self.max_age:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # mark as recently used for eviction, keeping the write time for expiry
+            os.utime(path, (now, stat.st_mtime))
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry['content']
+
+    def summary(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            hit_rate = self.hits / lookups if lookups else 0.0
+            return f"Response cache: {self.hits}/{lookups} lookups served from {self.cache_dir} ({hit_rate:.1%})"
+
+    def put(self, key, content, model=None):
+        if self.bypass:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'model': model, 'created': time.time(), 'content': content}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        """Removes expired entries, then least recently used ones until under the size limit."""
+        with self._lock:
+            now = time.time()
+            entries = []
+            for root, _dirs, files in os.walk(self.cache_dir):
+                for name in files:
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    if name.endswith('.tmp') or (self.max_age and now - stat.st_mtime > self.max_age):
+                        os.remove(path)
+                        continue
+                    entries.append((stat.st_atime, stat.st_size, path))
+            if not self.max_bytes:
+                return
+            total = sum(size for _, size, _ in entries)
+            for _atime, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                os.remove(path)
+                total -= size
+
+
+def load_response_cache(config, bypass=False, refresh=False):
+    """Builds a ResponseCache from the optional [CACHE] section of config.ini."""
+    enabled = config.getboolean('CACHE', 'enabled', fallback=True)
+    return ResponseCache(
+        cache_dir=config.get('CACHE', 'directory', fallback=DEFAULT_CACHE_DIR),
+        max_size_mb=config.getfloat('CACHE', 'max_size_mb', fallback=DEFAULT_MAX_SIZE_MB),
+        max_age_days=config.getfloat('CACHE', 'max_age_days', fallback=DEFAULT_MAX_AGE_DAYS),
+        bypass=bypass or not enabled or config.getboolean('CACHE', 'bypass', fallback=False),
+        refresh=refresh or config.getboolean('CACHE', 'refresh', fallback=False),
+    )
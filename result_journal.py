@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def journal_key(prompt, model, system_prompt):
+    """Identifies a completed unit of work: prompt hash + model + system prompt hash."""
+    return f"{text_hash(prompt)}:{model}:{text_hash(system_prompt)}"
+
+
+def archive_filepath(filepath, timestamp=None):
+    """A free name for setting an earlier journal aside, e.g. out.journal.20240101-120000.jsonl."""
+    root, ext = os.path.splitext(filepath)
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(timestamp))
+    candidate = f"{root}.{stamp}{ext}"
+    n = 1
+    while os.path.exists(candidate):
+        candidate = f"{root}.{stamp}-{n}{ext}"
+        n += 1
+    return candidate
+
+
+class ResultJournal:
+    """Append-only JSONL journal of completed results.
+
+    Every record is written and fsync'd as soon as it is appended, so a crash only
+    loses work that was still in flight. A torn final line (crash mid-write) is
+    ignored when the journal is read back. Without resume, an existing journal is
+    moved aside to a timestamped name rather than deleted, so its completions can
+    still be recovered (rename it back and run with resume).
+    """
+
+    def __init__(self, filepath, resume=False):
+        self.filepath = filepath
+        self._lock = threading.Lock()
+        self.records = {}
+        if resume:
+            self.records = self.load(filepath)
+        elif os.path.exists(filepath):
+            archived = archive_filepath(filepath)
+            os.replace(filepath, archived)
+            print(f"Moved the previous journal to {archived}; rename it back and resume to reuse it")
+
+    @staticmethod
+    def load(filepath):
+        records = {}
+        if not os.path.exists(filepath):
+            return records
+        with open(filepath, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[record['key']] = record
+        return records
+
+    def get(self, key):
+        return self.records.get(key)
+
+    def __contains__(self, key):
+        return key in self.records
+
+    def append(self, key, record):
+        record = dict(record, key=key, completed_at=time.time())
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.filepath, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.records[key] = record
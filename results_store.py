@@ -0,0 +1,55 @@
+import json
+import os
+
+
+def is_jsonl(filepath):
+    return filepath.endswith('.jsonl')
+
+
+def write_results(filepath, records):
+    """Writes result records as JSONL (.jsonl) or as a JSON list (any other extension).
+
+    The file is written to a temporary name and renamed, so readers never see a partial file.
+    """
+    tmp_filepath = f"{filepath}.tmp"
+    with open(tmp_filepath, 'w', encoding='utf-8') as f:
+        if is_jsonl(filepath):
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        else:
+            json.dump(list(records), f, indent=4, ensure_ascii=False)
+    os.replace(tmp_filepath, filepath)
+
+
+def read_results(filepath):
+    """Yields the records of a file written by write_results."""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        if not is_jsonl(filepath):
+            yield from json.load(f)
+            return
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def export_parquet(records, filepath):
+    """Writes result records to Parquet (needs pandas with pyarrow or fastparquet)."""
+    import pandas as pd
+
+    df = pd.DataFrame.from_records(list(records))
+    for col in df.columns:
+        # nested values (e.g. evaluation lists) are stored as JSON strings
+        if df[col].map(lambda value: isinstance(value, (list, dict))).any():
+            df[col] = df[col].map(lambda value: json.dumps(value) if isinstance(value, (list, dict)) else value)
+    df.to_parquet(filepath, index=False)
+
+
+def render_report(records, filepath, format_entry):
+    """Renders records into a human-readable text report with format_entry(prompt, text)."""
+    with open(filepath, 'w', encoding='utf-8') as f:
+        for record in records:
+            text = record.get('response')
+            if record.get('error') is not None:
+                text = f"ERROR: {record['error']}"
+            f.write(format_entry(record['prompt'], text))
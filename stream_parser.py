@@ -0,0 +1,101 @@
+THINK_START = '<think>'
+THINK_END = '</think>'
+JSON_FENCE_OPEN = '```json'
+JSON_FENCE_CLOSE = '```'
+
+_TAIL_LENGTH = max(len(THINK_START), len(THINK_END), len(JSON_FENCE_OPEN)) - 1
+
+
+class StreamParser:
+    """Incremental consumer for streamed completion text.
+
+    Chunks are kept in a list (joined once, on demand) and only the newly received text,
+    plus a short tail for markers split across chunks, is scanned for the end of the
+    </think> section and for the ```json ... ``` fence. With require_think, the JSON fence
+    is only looked for after </think>. Without it, a fence is taken from the start of the
+    text unless a <think> comes first, in which case the fence is again only looked for after
+    </think> (so a draft written while reasoning is never picked up). The result does not
+    depend on how the text is split into chunks.
+    """
+
+    def __init__(self, require_think=True):
+        self.require_think = require_think
+        self.think_start = None  # offset of a <think> that comes before any JSON fence
+        self.think_end = None  # offset just after </think>
+        self.json_start = None  # offset just after the opening ```json
+        self.json_end = None  # offset of the closing ```
+        self._parts = []
+        self._length = 0
+        self._tail = ''
+        self._text = None
+
+    @classmethod
+    def from_text(cls, text, require_think=True):
+        parser = cls(require_think)
+        parser.feed(text)
+        return parser
+
+    def feed(self, text):
+        if not text:
+            return
+        window_start = self._length - len(self._tail)
+        window = self._tail + text
+        self._parts.append(text)
+        self._length += len(text)
+        self._text = None
+        self._scan(window, window_start)
+        self._tail = window[-_TAIL_LENGTH:]
+
+    def _find(self, window, window_start, marker, min_offset):
+        index = window.find(marker, max(0, min_offset - window_start))
+        return None if index == -1 else window_start + index
+
+    def _scan(self, window, window_start):
+        if self.think_end is None:
+            position = self._find(window, window_start, THINK_END, 0)
+            if position is not None:
+                self.think_end = position + len(THINK_END)
+        if self.json_start is None:
+            if self.think_start is None and not self.require_think:
+                think_start = self._find(window, window_start, THINK_START, 0)
+                fence = self._find(window, window_start, JSON_FENCE_OPEN, 0)
+                if think_start is not None and (fence is None or think_start < fence):
+                    self.think_start = think_start
+            if self.require_think or self.think_start is not None:
+                if self.think_end is None:
+                    return
+                min_offset = self.think_end
+            else:
+                min_offset = 0
+            position = self._find(window, window_start, JSON_FENCE_OPEN, min_offset)
+            if position is None:
+                return
+            self.json_start = position + len(JSON_FENCE_OPEN)
+        if self.json_end is None:
+            self.json_end = self._find(window, window_start, JSON_FENCE_CLOSE, self.json_start)
+
+    @property
+    def json_complete(self):
+        return self.json_end is not None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = ''.join(self._parts)
+            self._parts = [self._text]
+        return self._text
+
+    @property
+    def answer(self):
+        """Text after </think>, or None if the think section never ended."""
+        if self.think_end is None:
+            return None
+        return self.text[self.think_end:].strip()
+
+    @property
+    def json_text(self):
+        """Contents of the first complete ```json fence, or None."""
+        if not self.json_complete:
+            return None
+        return self.text[self.json_start:self.json_end].strip()
+
@@ -0,0 +1,209 @@
+import os
+from collections import Counter
+
+import pandas as pd
+
+from bootstrap import bootstrap_scores, proportion_interval, two_proportion_test
+from judge_voting import NOT_JUDGED, QUESTION_COUNT, answers, is_valid_evaluation
+from results_store import read_results
+
+QUESTIONS = [f'q{q + 1}' for q in range(QUESTION_COUNT)]
+FAILURES = ('error', 'malformed', 'missing')
+NO_TOPIC = '(no topic)'
+
+
+def record_scores(record):
+    """(q1-q4 as 0/1, None) for a judged evaluation entry, or (None, failure category).
+
+    Entries with an error (unanswered prompt or failed judge call) are 'error', judge
+    outputs without a yes/no answer to every question 'malformed', and entries with neither
+    an evaluation nor an error 'missing'. Questions answered NOT_JUDGED (pairs skipped after
+    failing the precheck) score None and are left out of that question's score only.
+    """
+    if record.get('error') is not None:
+        return None, 'error'
+    evaluation = record.get('evaluation')
+    if evaluation is None:
+        return None, 'missing'
+    if not is_valid_evaluation(evaluation, allow_not_judged=True):
+        return None, 'malformed'
+    return [None if answer == NOT_JUDGED else int(answer == 'yes') for answer in answers(evaluation)], None
+
+
+class RunTally:
+    """Running counts of one evaluation run, fed one record at a time.
+
+    Only the yes and scored counts per topic and question and the failures per category
+    are kept, so memory grows with the number of topics, not of records.
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.records = 0
+        self.failures = Counter()
+        self.topics = {}
+
+    def add(self, record):
+        scores, failure = record_scores(record)
+        topic = record.get('topic') or NO_TOPIC
+        counts = self.topics.get(topic)
+        if counts is None:
+            counts = self.topics[topic] = {'records': 0, 'judged': 0, 'yes': [0] * QUESTION_COUNT,
+                                           'scored': [0] * QUESTION_COUNT, 'failures': Counter()}
+        self.records += 1
+        counts['records'] += 1
+        if scores is None:
+            self.failures[failure] += 1
+            counts['failures'][failure] += 1
+            return
+        counts['judged'] += 1
+        for q, score in enumerate(scores):
+            if score is not None:
+                counts['yes'][q] += score
+                counts['scored'][q] += 1
+
+    def extend(self, records):
+        for record in records:
+            self.add(record)
+        return self
+
+    @property
+    def judged(self):
+        return self.records - sum(self.failures.values())
+
+    def yes(self):
+        return [sum(counts['yes'][q] for counts in self.topics.values()) for q in range(QUESTION_COUNT)]
+
+    def scored(self):
+        """Judged entries per question, without the questions that were not judged."""
+        return [sum(counts['scored'][q] for counts in self.topics.values()) for q in range(QUESTION_COUNT)]
+
+    def run_row(self):
+        judged = self.judged
+        row = {'records': self.records, 'judged': judged}
+        row.update({failure: self.failures[failure] for failure in FAILURES})
+        row['failure_rate'] = (self.records - judged) / self.records if self.records else float('nan')
+        row.update({question: yes / scored if scored else float('nan')
+                    for question, yes, scored in zip(QUESTIONS, self.yes(), self.scored())})
+        return row
+
+    def question_table(self, alpha=0.05):
+        yes = self.yes()
+        judged = self.scored()
+        low, high = proportion_interval(yes, judged, alpha)
+        return pd.DataFrame({'yes': yes, 'judged': judged,
+                             'score': [y / n if n else float('nan') for y, n in zip(yes, judged)],
+                             'ci_low': low, 'ci_high': high}, index=pd.Index(QUESTIONS, name='question'))
+
+    def topic_table(self):
+        rows = []
+        for topic, counts in self.topics.items():
+            row = {'topic': topic, 'records': counts['records'], 'judged': counts['judged'],
+                   'failed': sum(counts['failures'].values())}
+            row.update({question: yes / scored if scored else float('nan')
+                        for question, yes, scored in zip(QUESTIONS, counts['yes'], counts['scored'])})
+            rows.append(row)
+        return pd.DataFrame(rows, columns=['topic', 'records', 'judged', 'failed'] + QUESTIONS).set_index('topic')
+
+
+def compare_runs(previous, current):
+    """Score and failure-rate changes from one RunTally to the next, with two-sided p-values."""
+    yes_a, yes_b = current.yes(), previous.yes()
+    successes_a = yes_a + [current.records - current.judged]
+    totals_a = current.scored() + [current.records]
+    successes_b = yes_b + [previous.records - previous.judged]
+    totals_b = previous.scored() + [previous.records]
+    p_values = two_proportion_test(successes_a, totals_a, successes_b, totals_b)
+    rows = []
+    for i, metric in enumerate(QUESTIONS + ['failure_rate']):
+        before = successes_b[i] / totals_b[i] if totals_b[i] else float('nan')
+        after = successes_a[i] / totals_a[i] if totals_a[i] else float('nan')
+        rows.append({'run': current.label, 'previous': previous.label, 'metric': metric, 'previous_score': before,
+                     'score': after, 'difference': after - before, 'p_value': p_values[i]})
+    return rows
+
+
+def run_label(filepath, labels):
+    label = os.path.splitext(os.path.basename(filepath))[0]
+    return label if label not in labels else filepath
+
+
+def tally_runs(input_files, labels=None, output_prefix=None, alpha=0.05):
+    """Per-run, per-question and per-topic score tables over several evaluation runs, oldest first.
+
+    Runs are read one at a time and record by record (JSONL files are never loaded whole),
+    and only counts are kept, so many historical runs can be aggregated in bounded memory.
+    Error, malformed and missing evaluations are counted as failures instead of scored.
+    Scores are shares of 'yes' over the judged entries with Wilson intervals, and each run
+    is compared with the one before it (two-proportion z-tests). With output_prefix, the
+    tables are also written to <output_prefix>_{runs,questions,topics,comparison}.csv.
+    """
+    runs = []
+    for i, filepath in enumerate(input_files):
+        label = labels[i] if labels else run_label(filepath, [run.label for run in runs])
+        runs.append(RunTally(label).extend(read_results(filepath)))
+    labels = [run.label for run in runs]
+    tables = {
+        'runs': pd.DataFrame([run.run_row() for run in runs], index=pd.Index(labels, name='run')),
+        'questions': pd.concat([run.question_table(alpha) for run in runs], keys=labels, names=['run']),
+        'topics': pd.concat([run.topic_table() for run in runs], keys=labels, names=['run']),
+        'comparison': pd.DataFrame([row for previous, current in zip(runs, runs[1:])
+                                    for row in compare_runs(previous, current)],
+                                   columns=['run', 'previous', 'metric', 'previous_score', 'score', 'difference',
+                                            'p_value']),
+    }
+    print(tables['runs'].to_string(float_format=lambda value: f"{value:.3f}"))
+    if len(runs) > 1:
+        print(tables['comparison'].to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+    if output_prefix is not None:
+        for name, table in tables.items():
+            table.to_csv(f"{output_prefix}_{name}.csv", index=name != 'comparison')
+    return tables
+
+
+def print_scores(scores):
+    for col, row in scores.iterrows():
+        print(f"Score for {col}: {row['score']} (95% CI {row['ci_low']:.3f}-{row['ci_high']:.3f})")
+
+
+def tally_results(input_file, output_file=None, n_resamples=2000, n_jobs=1, measure_index=None):
+    """Prints the proportion of 'yes' answers per question with a 95% bootstrap confidence interval.
+
+    Error, malformed and missing evaluations are counted per category and left out of the
+    scores; questions that were not judged are left out of their question's score. With a measure_index.MeasureIndex, the deterministic response checks (no
+    hallucinated dashboard URLs, no unknown measure IDs, cites a measure, coverage, source
+    accuracy) are scored alongside.
+    """
+    data_list = []
+    checked = []
+    failures = Counter()
+    for prompt_response in read_results(input_file):
+        prompt = prompt_response['prompt']
+        if measure_index is not None:
+            checked.append({'prompt': prompt, 'response': prompt_response.get('response')})
+        scores, failure = record_scores(prompt_response)
+        if scores is None:
+            failures[failure] += 1
+            continue
+        data_list.append((prompt, *(float('nan') if score is None else score for score in scores)))
+    df = pd.DataFrame(data_list, columns=['prompt'] + QUESTIONS)
+    if failures:
+        print(f"{sum(failures.values())} entries without a usable evaluation were left out: "
+              f"{', '.join(f'{count} {failure}' for failure, count in failures.items())}")
+    if output_file is not None:
+        df.to_csv(output_file, index=False)
+    if df.empty:
+        print("No judged entries to score")
+        return None
+    scores = bootstrap_scores(df[QUESTIONS], n_resamples=n_resamples, n_jobs=n_jobs)
+    print_scores(scores)
+    if measure_index is not None:
+        from measure_index import response_scores
+
+        checks = response_scores(checked, measure_index)
+        print(f"Deterministic checks over {len(checks)} responses:")
+        check_scores = pd.concat([bootstrap_scores(checks[[col]].dropna(), n_resamples=n_resamples, n_jobs=n_jobs)
+                                  for col in checks.columns[1:] if checks[col].notna().any()])
+        print_scores(check_scores)
+        scores = pd.concat([scores, check_scores])
+    return scores
@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+from collections import Counter
+
+DEFAULT_TELEMETRY_FILEPATH = 'telemetry.jsonl'
+DEFAULT_SUMMARY_FILEPATH = 'telemetry_summary.json'
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile (q in 0..100) of a list of numbers."""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class CallTimer:
+    """Timestamps for a single LLM call; filled in by the caller as the stream arrives."""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.first_token = None
+        self.end = None
+
+    def mark_first_token(self):
+        if self.first_token is None:
+            self.first_token = time.monotonic()
+
+    def stop(self):
+        self.end = time.monotonic()
+
+    @property
+    def ttft(self):
+        return None if self.first_token is None else self.first_token - self.start
+
+    @property
+    def latency(self):
+        return None if self.end is None else self.end - self.start
+
+
+class Telemetry:
+    """Per-call latency/token metrics, appended to a JSONL file and summarized per run.
+
+    Costs use the [TELEMETRY] input_cost_per_million / output_cost_per_million prices.
+    """
+
+    def __init__(self, filepath=DEFAULT_TELEMETRY_FILEPATH, input_cost_per_million=0.0,
+                 output_cost_per_million=0.0):
+        self.filepath = filepath
+        self.input_cost_per_million = input_cost_per_million
+        self.output_cost_per_million = output_cost_per_million
+        self.run_id = time.strftime('%Y%m%dT%H%M%S')
+        self.records = []
+        self._lock = threading.Lock()
+
+    def record(self, **metrics):
+        record = dict(metrics, run_id=self.run_id, timestamp=time.time())
+        with self._lock:
+            self.records.append(record)
+            if self.filepath:
+                with open(self.filepath, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record) + '\n')
+
+    def summary(self, stage=None):
+        """Aggregates the calls of one stage (a name or a tuple of names), or of all stages."""
+        stages = (stage,) if isinstance(stage, str) else stage
+        with self._lock:
+            records = [r for r in self.records if stages is None or r.get('stage') in stages]
+        completed = [r for r in records if r['status'] == 'ok']
+        latencies = [r['latency'] for r in completed if r.get('latency') is not None]
+        ttfts = [r['ttft'] for r in completed if r.get('ttft') is not None]
+        prompt_tokens = sum(r.get('prompt_tokens') or 0 for r in completed)
+        completion_tokens = sum(r.get('completion_tokens') or 0 for r in completed)
+        streaming_time = sum(latencies)
+        return {
+            'run_id': self.run_id,
+            'stage': stage,
+            'calls': len(records),
+            'completed': len(completed),
+            'cached': sum(1 for r in records if r['status'] == 'cached'),
+            'failures_by_type': dict(Counter(r.get('error_type') for r in records if r['status'] == 'error')),
+            'retries': sum(r.get('retries') or 0 for r in records),
+            'latency_p50': percentile(latencies, 50),
+            'latency_p95': percentile(latencies, 95),
+            'latency_p99': percentile(latencies, 99),
+            'ttft_p50': percentile(ttfts, 50),
+            'ttft_p95': percentile(ttfts, 95),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'reasoning_tokens': sum(r.get('reasoning_tokens') or 0 for r in completed),
+            'answer_tokens': sum(r.get('answer_tokens') or 0 for r in completed),
+            'tokens_per_second': completion_tokens / streaming_time if streaming_time else None,
+            'estimated_cost': (prompt_tokens * self.input_cost_per_million
+                               + completion_tokens * self.output_cost_per_million) / 1_000_000,
+        }
+
+    def write_summary(self, filepath=DEFAULT_SUMMARY_FILEPATH):
+        with self._lock:
+            stages = sorted({r.get('stage') for r in self.records if r.get('stage') is not None})
+        summary = {'overall': self.summary(), 'stages': {stage: self.summary(stage) for stage in stages}}
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=4)
+        return summary
+
+    def print_summary(self):
+        summary = self.summary()
+
+        def fmt(value):
+            return 'n/a' if value is None else f"{value:.2f}"
+
+        print(f"Calls: {summary['calls']} (completed {summary['completed']}, cached {summary['cached']}, "
+              f"retries {summary['retries']})")
+        print(f"Latency p50/p95/p99 (s): {fmt(summary['latency_p50'])} / {fmt(summary['latency_p95'])} / "
+              f"{fmt(summary['latency_p99'])}, time to first token p50: {fmt(summary['ttft_p50'])}")
+        print(f"Tokens: {summary['prompt_tokens']} prompt, {summary['completion_tokens']} completion "
+              f"({summary['reasoning_tokens']} reasoning, {summary['answer_tokens']} answer), "
+              f"{fmt(summary['tokens_per_second'])} tokens/s, estimated cost {summary['estimated_cost']:.4f}")
+        if summary['failures_by_type']:
+            print(f"Failures by type: {summary['failures_by_type']}")
+
+
+def load_telemetry(config):
+    """Builds Telemetry from the optional [TELEMETRY] section of config.ini."""
+    return Telemetry(
+        filepath=config.get('TELEMETRY', 'filepath', fallback=DEFAULT_TELEMETRY_FILEPATH),
+        input_cost_per_million=config.getfloat('TELEMETRY', 'input_cost_per_million', fallback=0.0),
+        output_cost_per_million=config.getfloat('TELEMETRY', 'output_cost_per_million', fallback=0.0),
+    )
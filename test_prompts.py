@@ -1,25 +1,7 @@
-from openai import OpenAI
-import pandas as pd
-import configparser
-import re
-import json
+from automated_query_generation import get_runtime
+from message_builder import build_messages
+from metadata_retrieval import load_metadata_context
 
-config = configparser.ConfigParser()
-config.read('config.ini')
-api_key = config.get('API', 'api_key')
-base_url = config.get('API', 'base_url')
-llm = OpenAI(
-    api_key=api_key,
-    base_url=base_url,
-)
-
-metadata_filepath = 'current_metadata_official_urls_new.csv'
-metadata_df = pd.read_csv(metadata_filepath)
-metadata_df = metadata_df[~metadata_df['newMeasureID'].isna()]
-metadata_df.set_index('newMeasureID', inplace=True)
-metadata_json = metadata_df.to_json(orient='index', indent=2)
-
-results = {}
 system_prompt = """
                 Please answer questions about the provided metadata file. Only use the data in this file to answer questions. 
                 If a question does not pertain to the metadata file, just say so and do not attempt to answer. 
@@ -30,28 +12,32 @@ system_prompt = """
                 dashboard URLs for each of those as well.
 """
 
+
+def ask(prompt, metadata_context, model="DeepSeek-R1", metadata_filename=None):
+    """Streams the answer to a single prompt to stdout, for trying out the metadata prompt by hand."""
+    # with open(metadata_filepath, 'r') as file:
+    #     file_content = file.read()
+    try:
+        completion = get_runtime().llm.chat.completions.create(
+            model=model,
+            messages=build_messages(system_prompt, f"{prompt}\n", metadata_context.for_query(prompt),
+                                    metadata_filename or metadata_context.filename),
+            stream=True
+        )
+        for chunk in completion:
+            if chunk.choices:
+                content = chunk.choices[0].delta.content
+                if content is not None:
+                    print(content, end="", flush=True)
+    except Exception as e:
+        print(f"ERROR: {e}")
+
+
+metadata_filepath = 'current_metadata_official_urls_new.csv'
+metadata_mode = 'full'  # 'full' sends the whole metadata file, 'retrieval' only the top-k relevant measures
+metadata_encoding = 'json_indent'  # 'json_indent' (original), 'json_min' or 'csv'
 prompt = 'What data measures are available for tracking drug overdose fatalities?'
 
-# with open(metadata_filepath, 'r') as file:
-#     file_content = file.read()
-try:
-    completion = llm.chat.completions.create(
-        model="DeepSeek-R1",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": [
-                {"type": "text",
-                 "text": f"{prompt}\n"},
-                {"type": "text",
-                 "text": f"[file name]: {metadata_filepath[:-4]+'.json'}\n[file content begin]{metadata_json}[file content end]"}
-            ]},
-        ],
-        stream=True
-    )
-    for chunk in completion:
-        if chunk.choices:
-            content = chunk.choices[0].delta.content
-            if content is not None:
-                print(content, end="", flush=True)
-except Exception as e:
-    print(f"ERROR: {e}")
\ No newline at end of file
+if __name__ == '__main__':
+    metadata_context = load_metadata_context(metadata_filepath, mode=metadata_mode, encoding=metadata_encoding)
+    ask(prompt, metadata_context, metadata_filename=metadata_filepath[:-4] + metadata_context.extension)
@@ -0,0 +1,70 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+
+from agreement import CATEGORIES, cohens_kappa_matrix, fleiss_kappa_per_question, rating_codes, rating_columns  # noqa: E402
+
+QUESTIONS = (1, 2)
+SHEET = pd.DataFrame({
+    'Prompt': [f'prompt {i}' for i in range(10)],
+    'DRH-1': ['yes', 'yes', 'no', 'Yes', 'no', 'yes', np.nan, 'no', 'yes', 'yes'],
+    'ADM-1': ['yes', 'no', 'no', 'yes', 'yes', 'yes', 'yes', 'no', 'maybe', 'yes'],
+    'JKL-1': ['yes', 'no', 'NO', 'yes', 'no', 'no', 'yes', 'no', 'yes', np.nan],
+    'DRH-2': ['no', 'yes', 'yes', 'no', 'no', 'yes', 'yes', 'no', 'yes', 'no'],
+    'ADM-2': ['no', 'yes', ' yes ', 'yes', 'no', np.nan, 'yes', 'n/a', 'yes', 'no'],
+    'JKL-2': ['yes', 'yes', 'yes', 'no', 'no', 'yes', 'no', 'no', 'yes', 'no'],
+})
+RATERS = ['DRH', 'ADM', 'JKL']
+
+
+def normalized(question, rater):
+    return SHEET[f'{rater}-{question}'].map(lambda value: str(value).strip().lower())
+
+
+def codes():
+    raters = rating_columns(SHEET)
+    return rating_codes(SHEET, {rater: raters[rater] for rater in RATERS}, QUESTIONS)
+
+
+def test_fleiss_kappa_matches_statsmodels():
+    inter_rater = pytest.importorskip('statsmodels.stats.inter_rater')
+    expected = []
+    for question in QUESTIONS:
+        ratings = pd.concat([normalized(question, rater) for rater in RATERS], axis=1)
+        # items rated within the categories by every rater, as in the original per-question tables
+        complete = ratings[ratings.isin(CATEGORIES).all(axis=1)]
+        table = np.array([[list(row).count(category) for category in CATEGORIES] for row in complete.values])
+        expected.append(inter_rater.fleiss_kappa(table, method='fleiss'))
+    np.testing.assert_allclose(fleiss_kappa_per_question(codes()), expected)
+
+
+def test_cohens_kappa_matches_sklearn():
+    metrics = pytest.importorskip('sklearn.metrics')
+    matrix = cohens_kappa_matrix(codes())
+    for q, question in enumerate(QUESTIONS):
+        for r, rater_1 in enumerate(RATERS):
+            for s, rater_2 in enumerate(RATERS):
+                if r == s:
+                    continue
+                a, b = normalized(question, rater_1), normalized(question, rater_2)
+                both = a.isin(CATEGORIES) & b.isin(CATEGORIES)
+                assert matrix[q, r, s] == pytest.approx(metrics.cohen_kappa_score(a[both], b[both]))
+
+
+def test_unit_weights_match_the_point_estimates():
+    weights = np.ones((3, len(SHEET)))
+    np.testing.assert_allclose(fleiss_kappa_per_question(codes(), weights=weights)[1],
+                               fleiss_kappa_per_question(codes()))
+    np.testing.assert_allclose(cohens_kappa_matrix(codes(), weights=weights)[2], cohens_kappa_matrix(codes()))
+
+
+def test_fleiss_leaves_out_the_llm_rater():
+    from calculate_agreement import fleiss_kappa_fn
+
+    sheet = SHEET.assign(**{'LLM-1': ['no'] * len(SHEET), 'LLM-2': ['yes'] * len(SHEET)})
+    expected = fleiss_kappa_per_question(rating_codes(sheet, {rater: rating_columns(sheet)[rater]
+                                                              for rater in RATERS}))
+    results = fleiss_kappa_fn(sheet)
+    assert results['question_1_kappa'] == pytest.approx(expected[0])
+    assert results['question_2_kappa'] == pytest.approx(expected[1])
@@ -0,0 +1,75 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from change_detection import ChangeTracker  # noqa: E402
+from metadata_retrieval import MetadataContext  # noqa: E402
+
+SETTINGS = {'stage': 'test', 'model': 'R1'}
+QUERY = 'heroin deaths'
+
+
+def context(rows):
+    metadata_df = pd.DataFrame(rows, columns=['newMeasureID', 'measureName', 'source']).set_index('newMeasureID')
+    return MetadataContext(metadata_df, mode='retrieval', top_k=2, index_filepath=None)
+
+
+ROWS = [('M1', 'Heroin overdose deaths', 'Death certificates'),
+        ('M2', 'EMS naloxone administrations', 'EMS')]
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    """A manifest of a run that answered QUERY citing M1."""
+    filepath = str(tmp_path / 'out.jsonl.manifest.json')
+    tracker = ChangeTracker(filepath, context(ROWS), SETTINGS)
+    tracker.record(tracker.item_key(QUERY), QUERY, 'Use M1 for this.')
+    tracker.save()
+    return filepath
+
+
+def is_current(manifest, rows, settings=SETTINGS):
+    tracker = ChangeTracker(manifest, context(rows), settings)
+    return tracker.is_current(tracker.item_key(QUERY), QUERY), tracker
+
+
+def test_without_a_manifest_everything_reruns(tmp_path):
+    current, tracker = is_current(str(tmp_path / 'missing.json'), ROWS)
+    assert not current
+    assert tracker.changed is None
+
+
+def test_unchanged_item_is_reused(manifest):
+    current, tracker = is_current(manifest, ROWS)
+    assert current
+    assert tracker.reused == 1
+    assert tracker.changed == set()
+
+
+def test_unrelated_measure_change_keeps_the_item(manifest):
+    current, tracker = is_current(manifest, [ROWS[0], ('M2', 'EMS naloxone doses given', 'EMS')])
+    assert current
+    assert tracker.changed == {'M2'}
+
+
+def test_changed_dependency_reruns_the_item(manifest):
+    current, _ = is_current(manifest, [('M1', 'Heroin overdose deaths', 'Vital statistics'), ROWS[1]])
+    assert not current
+
+
+def test_newly_retrieved_measure_reruns_the_item(manifest):
+    current, tracker = is_current(manifest, ROWS + [('M3', 'Heroin treatment admissions', 'Hospital discharge')])
+    assert not current
+    assert tracker.changed == {'M3'}
+
+
+def test_changed_settings_rerun_everything(manifest):
+    current, tracker = is_current(manifest, ROWS, dict(SETTINGS, model='other'))
+    assert not current
+    assert tracker.changed is None
+
+
+def test_digest_follows_the_metadata(manifest):
+    _, before = is_current(manifest, ROWS)
+    _, after = is_current(manifest, [ROWS[0], ('M2', 'EMS naloxone doses given', 'EMS')])
+    assert before.digest != after.digest
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+pytest.importorskip('openai')
+pytest.importorskip('pandas')
+
+import automated_query_generation as pipeline  # noqa: E402
+from results_store import read_results, write_results  # noqa: E402
+from stream_parser import StreamParser  # noqa: E402
+
+EVALUATION = [{'question': str(q), 'answer': 'yes', 'justification': ''} for q in range(1, 5)]
+
+
+class FixedMetadata:
+    filename = 'metadata.json'
+
+    def for_query(self, query):
+        return '{}'
+
+    def for_queries(self, queries):
+        return '{}'
+
+
+def completion(value):
+    return StreamParser.from_text(f"<think>judging</think>\n```json\n{json.dumps(value)}\n```")
+
+
+@pytest.fixture
+def pairs_file(tmp_path):
+    filepath = str(tmp_path / 'responses.jsonl')
+    write_results(filepath, [{'prompt': f'prompt {i}', 'response': f'response {i}'} for i in range(4)])
+    return filepath
+
+
+def evaluate(pairs_file, tmp_path, monkeypatch, answer):
+    calls = []
+
+    def fake_stream_completion(messages, stage=None, **kwargs):
+        n_items = messages[-1]['content'][-1]['text'].count('ITEM: item_')
+        calls.append((stage, n_items))
+        return answer(stage, n_items, len(calls))
+
+    monkeypatch.setattr(pipeline, 'stream_completion', fake_stream_completion)
+    output = str(tmp_path / 'evaluation.jsonl')
+    pipeline.evaluate_prompts(pairs_file, output, FixedMetadata(), max_concurrency=1, batch_size=4)
+    return calls, list(read_results(output))
+
+
+def test_missing_items_are_re_split(pairs_file, tmp_path, monkeypatch):
+    def answer(stage, n_items, call):
+        if stage == 'evaluate':
+            return completion(EVALUATION)
+        # the first batch answer leaves out items 3 and 4
+        items = range(1, 3) if call == 1 else range(1, n_items + 1)
+        return completion({f'item_{i}': EVALUATION for i in items})
+
+    calls, results = evaluate(pairs_file, tmp_path, monkeypatch, answer)
+    assert calls == [('evaluate_batch', 4), ('evaluate', 0), ('evaluate', 0)]
+    assert all(result['evaluation'] == EVALUATION for result in results)
+    assert [result['prompt'] for result in results] == [f'prompt {i}' for i in range(4)]
+
+
+def test_a_failed_batch_call_is_not_re_split(pairs_file, tmp_path, monkeypatch):
+    def answer(stage, n_items, call):
+        raise RuntimeError('endpoint down')
+
+    calls, results = evaluate(pairs_file, tmp_path, monkeypatch, answer)
+    assert calls == [('evaluate_batch', 4)]
+    assert [result['error'] for result in results] == ['endpoint down'] * 4
@@ -0,0 +1,43 @@
+from judge_voting import NOT_JUDGED, aggregate_votes, is_unanimous, is_valid_evaluation
+
+
+def evaluation(*answers):
+    return [{'question': str(q + 1), 'answer': answer, 'justification': f'{answer} {q + 1}'}
+            for q, answer in enumerate(answers)]
+
+
+def test_majority_per_question():
+    votes = [evaluation('yes', 'yes', 'no', 'yes'), evaluation('yes', 'no', 'no', 'yes'),
+             evaluation('no', 'no', 'yes', 'Yes')]
+    aggregated = aggregate_votes(votes)
+    assert [item['answer'] for item in aggregated] == ['yes', 'no', 'no', 'yes']
+    assert aggregated[0]['votes'] == {'yes': 2, 'no': 1}
+    assert aggregated[3]['agreement'] == 1.0
+    assert aggregated[1]['agreement'] == 2 / 3
+
+
+def test_justification_comes_from_the_majority():
+    aggregated = aggregate_votes([evaluation('no', 'yes', 'yes', 'yes'), evaluation('yes', 'yes', 'yes', 'yes'),
+                                  evaluation('yes', 'yes', 'yes', 'yes')])
+    assert aggregated[0]['justification'] == 'yes 1'
+
+
+def test_ties_resolve_to_no():
+    aggregated = aggregate_votes([evaluation('yes', 'yes', 'yes', 'yes'), evaluation('no', 'yes', 'yes', 'yes')])
+    assert aggregated[0]['answer'] == 'no'
+    assert aggregated[0]['agreement'] == 0.5
+
+
+def test_unanimity():
+    assert is_unanimous([evaluation('yes', 'no', 'yes', 'yes')] * 2)
+    assert not is_unanimous([evaluation('yes', 'no', 'yes', 'yes'), evaluation('yes', 'yes', 'yes', 'yes')])
+
+
+def test_validity():
+    assert is_valid_evaluation(evaluation('yes', 'no', 'yes', 'no'))
+    assert not is_valid_evaluation(evaluation('yes', 'no', 'maybe', 'no'))
+    assert not is_valid_evaluation(evaluation('yes', 'no', 'yes'))
+    assert not is_valid_evaluation({'item_1': evaluation('yes', 'no', 'yes', 'no')})
+    skipped = evaluation(NOT_JUDGED, NOT_JUDGED, 'no', NOT_JUDGED)
+    assert not is_valid_evaluation(skipped)
+    assert is_valid_evaluation(skipped, allow_not_judged=True)
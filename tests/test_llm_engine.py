@@ -0,0 +1,38 @@
+from llm_engine import RateLimiter
+
+
+def limiter_with(events, **limits):
+    limiter = RateLimiter(**limits)
+    for timestamp, tokens in events:
+        limiter._events.append((timestamp, tokens))
+        limiter._tokens_in_window += tokens
+    return limiter
+
+
+def test_no_wait_under_the_limits():
+    limiter = limiter_with([(0.0, 10)], requests_per_minute=2, tokens_per_minute=100)
+    assert limiter._wait_time(1.0, 10) == 0.0
+
+
+def test_request_limit_waits_for_the_oldest_request_to_leave_the_window():
+    limiter = limiter_with([(0.0, 0), (5.0, 0)], requests_per_minute=2)
+    assert limiter._wait_time(10.0, 0) == 50.0
+
+
+def test_token_limit_waits_until_enough_tokens_are_freed():
+    limiter = limiter_with([(0.0, 60), (20.0, 30)], tokens_per_minute=100)
+    # 60 + 30 + 50 > 100; freeing the first event leaves 30 + 50 <= 100
+    assert limiter._wait_time(30.0, 50) == 30.0
+    # 90 tokens only fit once both events left the window
+    assert limiter._wait_time(30.0, 90) == 50.0
+
+
+def test_oversized_request_waits_for_an_empty_window():
+    limiter = limiter_with([(0.0, 10), (10.0, 10)], tokens_per_minute=100)
+    assert limiter._wait_time(15.0, 500) == 55.0
+    assert limiter_with([], tokens_per_minute=100)._wait_time(15.0, 500) == 0.0
+
+
+def test_the_longer_of_both_waits_is_used():
+    limiter = limiter_with([(0.0, 10), (40.0, 80)], requests_per_minute=2, tokens_per_minute=100)
+    assert limiter._wait_time(45.0, 25) == 55.0
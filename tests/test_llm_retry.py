@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+pytest.importorskip('openai')
+
+from llm_retry import CallTimeout, CircuitBreaker, RetryPolicy, call_with_retry, retry_after  # noqa: E402
+
+
+def failing(failures, exc=CallTimeout):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise exc('failed')
+        return 'ok'
+    return fn, calls
+
+
+def test_transient_failures_are_retried():
+    fn, calls = failing(2)
+    retries = []
+    assert call_with_retry(fn, RetryPolicy(max_attempts=5, base_delay=0),
+                           on_retry=lambda attempt, e, delay: retries.append(attempt)) == 'ok'
+    assert len(calls) == 3
+    assert retries == [0, 1]
+
+
+def test_gives_up_after_max_attempts():
+    fn, calls = failing(10)
+    with pytest.raises(CallTimeout):
+        call_with_retry(fn, RetryPolicy(max_attempts=3, base_delay=0))
+    assert len(calls) == 3
+
+
+def test_non_transient_errors_are_not_retried():
+    fn, calls = failing(1, ValueError)
+    breaker = CircuitBreaker(failure_threshold=1)
+    with pytest.raises(ValueError):
+        call_with_retry(fn, RetryPolicy(max_attempts=5, base_delay=0), breaker)
+    assert len(calls) == 1
+    # the endpoint answered, so the breaker stays closed
+    assert not breaker.is_open
+
+
+def test_backoff_stays_within_max_delay():
+    policy = RetryPolicy(max_attempts=10, base_delay=1, max_delay=4)
+    assert all(0 <= policy.delay(attempt, CallTimeout()) <= 4 for attempt in range(9))
+    assert policy.delay(9, CallTimeout()) is None
+
+
+def test_breaker_opens_after_threshold_and_closes_after_a_successful_probe():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+    start = time.monotonic()
+    breaker.wait()
+    assert time.monotonic() - start >= 0.04
+    assert breaker.probing
+    breaker.record_success()
+    assert not breaker.is_open
+    assert breaker.failures == 0
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    opened_at = breaker.opened_at
+    breaker.wait()
+    breaker.record_failure()
+    assert breaker.is_open
+    assert breaker.opened_at > opened_at
+    assert not breaker.probing
+
+
+class HeaderError(Exception):
+    def __init__(self, headers):
+        super().__init__('rate limited')
+        self.response = type('Response', (), {'headers': headers})()
+
+
+def test_retry_after_headers():
+    assert retry_after(HeaderError({'retry-after': '3'})) == 3.0
+    assert retry_after(HeaderError({'retry-after-ms': '1500'})) == 1.5
+    assert retry_after(HeaderError({'retry-after': 'Wed, 21 Oct 2015 07:28:00 GMT'})) == 0.0
+    assert retry_after(HeaderError({})) is None
+    assert retry_after(ValueError('no response')) is None
+
+
+def test_unparseable_retry_after_is_ignored():
+    assert retry_after(HeaderError({'retry-after': 'soon'})) is None
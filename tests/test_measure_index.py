@@ -0,0 +1,69 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from measure_index import MeasureIndex  # noqa: E402
+
+URL = 'https://dash.example.org/measures'
+
+
+@pytest.fixture(scope='module')
+def index():
+    metadata_df = pd.DataFrame({
+        'newMeasureID': ['OD0001', 'OD0002'],
+        'measureName': ['Heroin overdose deaths', 'EMS naloxone administrations'],
+        'source': ['Death certificates', 'EMS'],
+        'dashboardURL': [f'{URL}/OD0001', f'{URL}/OD0002'],
+    }).set_index('newMeasureID')
+    return MeasureIndex(metadata_df, index_filepath=None, relevant_top_k=1)
+
+
+def test_valid_url_cites_its_measure(index):
+    check = index.check_response(f"See {URL}/OD0002. It counts naloxone given by EMS.")
+    assert check['valid_urls'] == [f'{URL}/OD0002']
+    assert check['measures'] == ['OD0002']
+    assert check['source_accuracy'] == 1.0
+    assert not check['hallucinated']
+
+
+def test_unknown_url_on_the_dashboard_host_is_hallucinated(index):
+    check = index.check_response(f"Look at {URL}/OD0099 for fentanyl.")
+    assert check['invalid_urls'] == [f'{URL}/OD0099']
+    assert check['unknown_measures'] == ['OD0099']
+    assert check['hallucinated']
+    assert 'OD0099' in index.findings(check)
+
+
+def test_unknown_measure_id_in_the_text_is_hallucinated(index):
+    check = index.check_response("Measures OD0001 and OD0042 cover this since 2019.")
+    assert check['measures'] == ['OD0001']
+    assert check['unknown_measures'] == ['OD0042']
+    assert check['hallucinated']
+
+
+def test_external_links_and_names(index):
+    check = index.check_response("Heroin overdose deaths (see https://www.cdc.gov/overdose) come from "
+                                 "death certificates.")
+    assert check['external_urls'] == ['https://www.cdc.gov/overdose']
+    assert check['measures'] == ['OD0001']
+    assert check['source_accuracy'] == 1.0
+    assert not check['hallucinated']
+
+
+def test_coverage_of_the_measures_relevant_to_the_prompt(index):
+    assert index.check_response("Use OD0001.", prompt='heroin deaths')['coverage'] == 1.0
+    assert index.check_response("Use OD0002.", prompt='heroin deaths')['coverage'] == 0.0
+    assert index.check_response("Use OD0002.")['coverage'] is None
+
+
+def test_year_and_code_like_tokens_are_not_unknown_measures(index):
+    check = index.check_response("FY2020 data from OD0001, see table AB1234 and https://www.cdc.gov/reports/FY2021.")
+    assert check['measures'] == ['OD0001']
+    assert check['unknown_measures'] == []
+    assert not check['hallucinated']
+
+
+def test_id_in_an_invalid_dashboard_url_is_unknown_whatever_its_prefix(index):
+    check = index.check_response(f"See {URL}/XY0042.")
+    assert check['unknown_measures'] == ['XY0042']
+    assert check['hallucinated']
@@ -0,0 +1,80 @@
+import os
+import time
+
+from response_cache import ResponseCache, cache_key
+
+
+def age(cache, key, seconds):
+    """Moves an entry's write time back by seconds, keeping its access time."""
+    path = cache._path(key)
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime - seconds))
+
+
+def test_key_covers_model_messages_and_params():
+    messages = [{'role': 'user', 'content': 'hi'}]
+    key = cache_key('model', messages, {'temperature': 0.6})
+    assert key == cache_key('model', messages, {'temperature': 0.6})
+    assert key != cache_key('model', messages)
+    assert key != cache_key('other', messages, {'temperature': 0.6})
+
+
+def test_hit_and_miss_are_counted(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    assert cache.get('abcd') is None
+    cache.put('abcd', 'completion')
+    assert cache.get('abcd') == 'completion'
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert '1/2 lookups' in cache.summary()
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put('abcd', 'completion')
+    with open(cache._path('abcd'), 'w', encoding='utf-8') as f:
+        f.write('{"content": "compl')
+    assert cache.get('abcd') is None
+
+
+def test_entries_expire_by_write_time_even_when_read(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_age_days=1)
+    cache.put('abcd', 'completion')
+    age(cache, 'abcd', 86400 - 60)
+    assert cache.get('abcd') == 'completion'
+    age(cache, 'abcd', 120)
+    assert cache.get('abcd') is None
+    assert not os.path.exists(cache._path('abcd'))
+
+
+def test_opening_the_cache_removes_expired_entries(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_age_days=1)
+    cache.put('abcd', 'old')
+    cache.put('abce', 'new')
+    age(cache, 'abcd', 2 * 86400)
+    cache.get('abcd')  # reading does not keep it alive
+    reopened = ResponseCache(str(tmp_path), max_age_days=1)
+    assert not os.path.exists(cache._path('abcd'))
+    assert reopened.get('abce') == 'new'
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_size_mb=0)
+    for key in ('aaaa', 'bbbb', 'cccc'):
+        cache.put(key, 'x' * 1000)
+    now = time.time()
+    for key, accessed in (('aaaa', now - 30), ('bbbb', now - 10), ('cccc', now - 20)):
+        os.utime(cache._path(key), (accessed, os.stat(cache._path(key)).st_mtime))
+    cache.get('aaaa')  # now the most recently used
+    size = os.path.getsize(cache._path('aaaa'))
+    ResponseCache(str(tmp_path), max_size_mb=2.5 * size / (1024 * 1024))
+    assert [os.path.exists(cache._path(key)) for key in ('aaaa', 'bbbb', 'cccc')] == [True, True, False]
+
+
+def test_bypass_and_refresh(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put('abcd', 'completion')
+    assert ResponseCache(str(tmp_path), refresh=True).get('abcd') is None
+    bypass = ResponseCache(str(tmp_path), bypass=True)
+    bypass.put('abce', 'completion')
+    assert bypass.get('abcd') is None
+    assert ResponseCache(str(tmp_path)).get('abce') is None
@@ -0,0 +1,43 @@
+import os
+
+from result_journal import ResultJournal, journal_key
+
+
+def test_resume_reads_back_completed_records(tmp_path):
+    filepath = str(tmp_path / 'out.journal.jsonl')
+    journal = ResultJournal(filepath)
+    key = journal_key('prompt', 'model', 'system')
+    journal.append(key, {'prompt': 'prompt', 'response': 'answer'})
+
+    resumed = ResultJournal(filepath, resume=True)
+    assert key in resumed
+    assert resumed.get(key)['response'] == 'answer'
+
+
+def test_torn_final_line_is_ignored(tmp_path):
+    filepath = str(tmp_path / 'out.journal.jsonl')
+    ResultJournal(filepath).append('a', {'response': 'first'})
+    with open(filepath, 'a', encoding='utf-8') as f:
+        f.write('{"key": "b", "respo')
+    resumed = ResultJournal(filepath, resume=True)
+    assert 'a' in resumed
+    assert 'b' not in resumed
+
+
+def test_without_resume_the_previous_journal_is_moved_aside(tmp_path):
+    filepath = str(tmp_path / 'out.journal.jsonl')
+    ResultJournal(filepath).append('a', {'response': 'first'})
+    fresh = ResultJournal(filepath)
+    assert 'a' not in fresh
+    assert not os.path.exists(filepath)
+    archived = [name for name in os.listdir(tmp_path) if name.startswith('out.journal.')]
+    assert len(archived) == 1
+    assert 'a' in ResultJournal.load(str(tmp_path / archived[0]))
+
+
+def test_keys_depend_on_prompt_model_and_system_prompt():
+    key = journal_key('prompt', 'model', 'system')
+    assert key == journal_key('prompt', 'model', 'system')
+    assert key != journal_key('other prompt', 'model', 'system')
+    assert key != journal_key('prompt', 'other model', 'system')
+    assert key != journal_key('prompt', 'model', 'other system')
@@ -0,0 +1,46 @@
+import os
+
+from results_store import read_results, render_report, write_results
+
+RECORDS = [
+    {'prompt': 'EMS data', 'topic': 'ems', 'response': 'Use M0001 – naloxone', 'model': 'R1'},
+    {'prompt': 'multi\nline', 'topic': None, 'response': None, 'error': 'Timeout'},
+    {'prompt': 'judged', 'evaluation': [{'question': '1', 'answer': 'yes', 'justification': ''}]},
+]
+
+
+def test_jsonl_round_trip(tmp_path):
+    filepath = str(tmp_path / 'results.jsonl')
+    write_results(filepath, iter(RECORDS))
+    assert list(read_results(filepath)) == RECORDS
+    with open(filepath, encoding='utf-8') as f:
+        assert len(f.readlines()) == len(RECORDS)
+
+
+def test_json_round_trip(tmp_path):
+    filepath = str(tmp_path / 'results.json')
+    write_results(filepath, iter(RECORDS))
+    assert list(read_results(filepath)) == RECORDS
+
+
+def test_blank_lines_are_skipped(tmp_path):
+    filepath = str(tmp_path / 'results.jsonl')
+    write_results(filepath, RECORDS[:1])
+    with open(filepath, 'a', encoding='utf-8') as f:
+        f.write('\n\n')
+    assert list(read_results(filepath)) == RECORDS[:1]
+
+
+def test_rewrite_replaces_the_file_without_leftovers(tmp_path):
+    filepath = str(tmp_path / 'results.jsonl')
+    write_results(filepath, RECORDS)
+    write_results(filepath, RECORDS[:1])
+    assert list(read_results(filepath)) == RECORDS[:1]
+    assert os.listdir(tmp_path) == ['results.jsonl']
+
+
+def test_report_shows_errors(tmp_path):
+    filepath = str(tmp_path / 'report.txt')
+    render_report(RECORDS[:2], filepath, lambda prompt, text: f"{prompt}: {text}\n")
+    with open(filepath, encoding='utf-8') as f:
+        assert f.read() == "EMS data: Use M0001 – naloxone\nmulti\nline: ERROR: Timeout\n"
@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from stream_parser import StreamParser
+
+SAMPLES = [
+    '<think>\nmaybe ```json\n{"draft": 1}\n``` no\n</think>\n\n```json\n{"final": 2}\n```',
+    '<think>\nreasoning only</think>\nanswer without JSON',
+    'no reasoning ```json\n[1, 2]\n``` then <think> later </think> ```json\n[3]\n```',
+    'reasoning without an opening tag ```json\n{"draft": 1}\n```</think>```json\n{"final": 2}\n```',
+    '```json\n{"a": 1}',
+]
+
+
+def offsets(parser):
+    return parser.think_end, parser.json_start, parser.json_end
+
+
+@pytest.mark.parametrize('require_think', [True, False])
+@pytest.mark.parametrize('text', SAMPLES)
+def test_random_chunking_finds_the_same_offsets(text, require_think):
+    expected = offsets(StreamParser.from_text(text, require_think))
+    rng = random.Random(0)
+    for _ in range(200):
+        parser = StreamParser(require_think)
+        position = 0
+        while position < len(text):
+            size = rng.randint(1, 12)
+            parser.feed(text[position:position + size])
+            position += size
+        assert offsets(parser) == expected
+
+
+def test_json_inside_think_is_ignored():
+    parser = StreamParser.from_text(SAMPLES[0])
+    assert parser.json_text == '{"final": 2}'
+    assert parser.answer.startswith('```json')
+
+
+def test_without_require_think_a_leading_fence_is_taken():
+    parser = StreamParser.from_text(SAMPLES[2], require_think=False)
+    assert parser.json_text == '[1, 2]'
+
+
+def test_unclosed_fence_is_incomplete():
+    parser = StreamParser.from_text(SAMPLES[4], require_think=False)
+    assert not parser.json_complete
+    assert parser.json_text is None
+
+
+def test_answer_needs_the_end_of_think():
+    assert StreamParser.from_text('<think>still reasoning').answer is None
+    assert StreamParser.from_text(SAMPLES[1]).answer == 'answer without JSON'
@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip('pandas')
+
+from judge_voting import NOT_JUDGED  # noqa: E402
+from tally import RunTally, record_scores  # noqa: E402
+
+
+def evaluation(*answers):
+    return [{'question': str(q + 1), 'answer': answer, 'justification': ''} for q, answer in enumerate(answers)]
+
+
+def test_judged_evaluation_scores():
+    assert record_scores({'evaluation': evaluation('yes', 'no', 'Yes', 'yes')}) == ([1, 0, 1, 1], None)
+
+
+def test_failure_categories():
+    assert record_scores({'error': 'Timeout', 'evaluation': evaluation('yes', 'yes', 'yes', 'yes')}) == (None, 'error')
+    assert record_scores({'prompt': 'p'}) == (None, 'missing')
+    assert record_scores({'evaluation': evaluation('yes', 'no', 'maybe', 'yes')}) == (None, 'malformed')
+    assert record_scores({'evaluation': 'not a list'}) == (None, 'malformed')
+
+
+def test_not_judged_questions_score_none():
+    skipped = evaluation(NOT_JUDGED, NOT_JUDGED, 'no', NOT_JUDGED)
+    assert record_scores({'evaluation': skipped}) == ([None, None, 0, None], None)
+
+
+def test_run_tally_keeps_not_judged_questions_out_of_their_score_only():
+    tally = RunTally('run').extend([
+        {'topic': 'a', 'evaluation': evaluation('yes', 'yes', 'yes', 'yes')},
+        {'topic': 'a', 'evaluation': evaluation(NOT_JUDGED, NOT_JUDGED, 'no', NOT_JUDGED)},
+        {'topic': 'b', 'error': 'Timeout'},
+    ])
+    row = tally.run_row()
+    assert row['records'] == 3
+    assert row['judged'] == 2
+    assert row['error'] == 1
+    assert row['q1'] == 1.0
+    assert row['q3'] == 0.5
+    assert tally.scored() == [1, 1, 2, 1]
+    assert tally.topic_table().loc['a', 'q3'] == 0.5